@@ -11,6 +11,9 @@ setup(
         'python-dateutil',
         'parsedatetime'
     ],
+    extras_require={
+        'keyring': ['keyring'],
+    },
     entry_points='''
         [console_scripts]
         youtrack=youtrack_time_importer.cli:youtrack
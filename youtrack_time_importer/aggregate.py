@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from youtrack import WorkItem
+from youtrack_time_importer.fingerprint import fingerprint
+from youtrack_time_importer.row import Row
+
+
+def round_minutes(seconds, rounding=1):
+    """Return seconds as minutes, rounded to the nearest multiple of rounding"""
+    return int(round(seconds / 60 / rounding)) * rounding
+
+
+class AggregatedRow(Row):
+    """several rows for the same issue, day and author merged into one
+
+    The WorkItem starts when the earliest row starts and lasts for the
+    total duration of the rows, rounded. Given the same rows it is always
+    the same WorkItem, so a re-run is still detected as a duplicate.
+    """
+
+    def __init__(self, rows, connection, username, rounding=1):
+        super().__init__(rows, connection, username)
+        self.rounding = rounding
+
+    @property
+    def rows(self):
+        return self.data
+
+    def first(self):
+        return min(self.rows, key=lambda row: int(row.work_item.date))
+
+    def create_work_item(self):
+        work_item = WorkItem()
+
+        descriptions = OrderedDict.fromkeys(row.work_item.description for row in self.rows)
+        seconds = sum(row.duration_as_seconds() for row in self.rows)
+
+        work_item.description = "\n".join(description for description in descriptions if description)
+        work_item.duration = str(round_minutes(seconds, self.rounding))
+        work_item.date = self.first().work_item.date
+
+        return work_item
+
+    def is_ignored(self):
+        return False
+
+    def find_issue_id(self):
+        return self.rows[0].issue_id
+
+    @property
+    def datetime_format(self):
+        return self.first().datetime_format
+
+    def start_string(self):
+        return self.first().start_string()
+
+    def fingerprint(self):
+        """Return the fingerprint of the merged WorkItem and the rows in it
+
+        The rows are identified by their own fingerprints, in sorted order,
+        so it never depends on the order the rows were read in.
+        """
+
+        if self._fingerprint is None:
+            members = ",".join(str(fp) for fp in sorted(row.fingerprint() for row in self.rows))
+            self._fingerprint = fingerprint(self.username, self.work_item.date, self.work_item.duration,
+                                            "{0}:{1}".format(self.issue_id, members))
+        return self._fingerprint
+
+    def source_ids(self):
+        return [source_id for row in self.rows for source_id in row.source_ids()]
+
+    def save_work_item(self):
+        super().save_work_item()
+        cls = type(self)
+        for source_id in self.source_ids():
+            cls.ids = source_id
+
+    def update_work_item(self, existing):
+        super().update_work_item(existing)
+        cls = type(self)
+        for source_id in self.source_ids():
+            cls.ids = source_id
+
+    def __str__(self):
+        return "{0} ({1} entries merged)".format(self.first(), len(self.rows))
+
+
+def aggregate(rows, connection, username, rounding=1):
+    """Merge rows for the same issue, day and author into AggregatedRows
+
+    Ignored rows and rows without an issue id are returned as they are, as
+    are rows with nothing to merge with, unless they need rounding. The
+    merged rows take the place of the first row of their group.
+
+    Args:
+        rows: Row objects
+        rounding: the number of minutes to round merged durations to
+    """
+
+    groups = OrderedDict()
+    for row in rows:
+        if row.is_ignored() or not row.issue_id:
+            groups[id(row)] = [row]
+        else:
+            key = (row.issue_id.upper(), row.start_datetime().date(), row.username)
+            groups.setdefault(key, []).append(row)
+
+    result = []
+    for key, group in groups.items():
+        if len(group) == 1 and (rounding == 1 or not isinstance(key, tuple)):
+            result.append(group[0])
+        else:
+            result.append(AggregatedRow(group, connection, username, rounding))
+    return result
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from xml.dom import minidom
+from youtrack.connection import Connection
+import re
+import threading
+import time
+
+# bytes counted for each entry on top of its content, for the key and response headers
+ENTRY_OVERHEAD = 512
+
+
+class ResponseCache(object):
+    """LRU cache of YouTrack GET responses, bounded by the bytes it holds
+
+    Each endpoint has its own time to live; responses from endpoints
+    without one, or with a TTL of 0, are never cached. Entries are
+    grouped by the issue they belong to, so a write to an issue drops
+    just that issue's entries (and any issue searches).
+    """
+
+    endpoints = (
+        ('user', re.compile(r"^/user/current/?$")),
+        ('work_items', re.compile(r"^/issue/(?P<issue_id>[^/?]+)/timetracking/workitem/?$")),
+        ('work_item', re.compile(r"^/issue/(?P<issue_id>[^/?]+)/timetracking/workitem/[^/?]+$")),
+        ('issue', re.compile(r"^/issue/(?P<issue_id>[^/?]+)/?(\?.*)?$")),
+        ('search', re.compile(r"^/issue/?\?")),
+    )
+
+    default_ttls = {
+        'user': 3600,
+        'work_items': 300,
+        'issue': 300,
+        'search': 60,
+    }
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttls=None):
+        """
+        Args:
+            ttls: dict of seconds per endpoint name, overriding default_ttls
+        """
+
+        self.max_bytes = max_bytes
+        self.ttls = dict(self.default_ttls, **(ttls or {}))
+        self.entries = OrderedDict()
+        self.groups = dict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, url):
+        """Return the endpoint name and issue id of url, or (None, None)"""
+
+        for name, pattern in self.endpoints:
+            match = pattern.match(url)
+            if match:
+                return name, match.groupdict().get('issue_id')
+        return None, None
+
+    def ttl(self, url):
+        name, issue_id = self.match(url)
+        return self.ttls.get(name, 0) if name else 0
+
+    def get(self, key, now=None):
+        """Return the cached value for key, or None if it isn't cached or has expired"""
+
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires, size, group = entry
+            if expires <= now:
+                self.remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl, size, group=None, now=None):
+        """Cache value for ttl seconds, evicting the least recently used entries to stay under max_bytes"""
+
+        now = time.monotonic() if now is None else now
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            while self.entries and self.size + size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+            self.entries[key] = (value, now + ttl, size, group)
+            self.groups.setdefault(group, set()).add(key)
+            self.size += size
+
+    def remove(self, key):
+        value, expires, size, group = self.entries.pop(key)
+        self.size -= size
+        keys = self.groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.groups[group]
+
+    def invalidate(self, url):
+        """Drop what a write to url may have changed
+
+        A write to an issue drops that issue's entries and all issue
+        searches. A write to anything else drops everything.
+        """
+
+        name, issue_id = self.match(url)
+        with self.lock:
+            if issue_id is None:
+                self.clear()
+                return
+            for group in (issue_id, 'search'):
+                for key in list(self.groups.get(group, ())):
+                    self.remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.groups.clear()
+        self.size = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.size,
+        }
+
+
+class CachedConnection(Connection):
+    """YouTrack Connection reading through a ResponseCache
+
+    GET requests to endpoints with a TTL are answered from the cache
+    while fresh. Every successful write, eg. createWorkItem, invalidates
+    the entries it may have changed. The cache can be shared between
+    connections to the same server, eg. by the sync workers.
+    """
+
+    def __init__(self, url, cache=None, *args, **kwargs):
+        self.cache = cache if cache is not None else ResponseCache()
+        super().__init__(url, *args, **kwargs)
+
+    def current_user(self):
+        """Return the XML of the current user, always asked of YouTrack
+
+        This is how a saved session is checked to be still alive, so the
+        answer must never come from the cache.
+        """
+
+        response, content = Connection._req(self, 'GET', '/user/current', content_type="application/xml")
+        return minidom.parseString(content)
+
+    def _req(self, method, url, body=None, ignoreStatus=None, content_type=None):
+        # full urls, eg. of a work item, are matched by their path under the REST root
+        path = url[len(self.baseUrl):] if url.startswith(self.baseUrl) else url
+        if method != 'GET':
+            result = super()._req(method, url, body, ignoreStatus, content_type)
+            self.cache.invalidate(path)
+            return result
+
+        ttl = self.cache.ttl(path)
+        if not ttl:
+            return super()._req(method, url, body, ignoreStatus, content_type)
+        key = (self.baseUrl, path, content_type)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response, content = super()._req(method, url, body, ignoreStatus, content_type)
+        if response.status == 200:
+            name, issue_id = self.cache.match(path)
+            group = 'search' if name == 'search' else issue_id
+            self.cache.set(key, (response, content), ttl, len(content) + len(path), group)
+        return response, content
@@ -3,7 +3,14 @@ __author__ = 'Matthew'
 from configparser import NoOptionError
 from dateutil.parser import parse as date_parse
 from parsedatetime import Calendar
-from youtrack.connection import Connection
+from youtrack_time_importer.aggregate import aggregate
+from youtrack_time_importer.cache import CachedConnection
+from youtrack_time_importer.cache import ResponseCache
+from youtrack_time_importer.credentials import delete_password
+from youtrack_time_importer.credentials import get_password
+from youtrack_time_importer.credentials import SessionCache
+from youtrack_time_importer.credentials import set_password
+from youtrack_time_importer.row import Row
 from youtrack_time_importer.row import TogglCSVRow
 from youtrack_time_importer.row import TogglAPIRow
 from youtrack_time_importer.row import ManictimeRow
@@ -11,27 +18,70 @@ from youtrack_time_importer.row import YoutrackIssueNotFoundException
 from youtrack_time_importer.row import YoutrackMissingConnectionException
 from youtrack_time_importer.row import YoutrackWorkItemIncorrectException
 from youtrack_time_importer.date_range_enum import DateRangeEnum
+from youtrack_time_importer import toggl as toggl_api
+from youtrack_time_importer.mapped_csv import MappedCSVReader
+from youtrack_time_importer.output import create_reporter
+from youtrack_time_importer.output import reporters
+from youtrack_time_importer.parallel import parse_file
+from youtrack_time_importer.plan import Plan
+from youtrack_time_importer.plan import PlannedRow
+from youtrack_time_importer.plan import Planner
+from youtrack_time_importer.profiler import Profiler
+from youtrack_time_importer.reconcile import reconcile as reconcile_entries
+from youtrack_time_importer.reconcile import source_entries
+from youtrack_time_importer.reconcile import write_differences
+from youtrack_time_importer.store import refresh as refresh_store
+from youtrack_time_importer.store import WorkItemStore
+from youtrack_time_importer.sync import Backpressure
+from youtrack_time_importer.sync import Importer
+from youtrack_time_importer.sync import JobQueue
+from youtrack_time_importer.sync import Scheduler
+from youtrack_time_importer.sync import SyncLock
+from youtrack_time_importer.sync import SyncService
 import click
 import configparser
 import csv
+import datetime
+import functools
 import json
 import os
 import requests
+import sys
 import youtrack as yt
+import zoneinfo
 
 
-def config_path():
+@functools.lru_cache(maxsize=None)
+def app_dir():
     path = click.get_app_dir("YouTrack")
-    if not os.path.exists(path):
-        os.mkdir(path)
-    return os.path.join(click.get_app_dir("YouTrack"), 'config.ini')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def app_path(name):
+    return os.path.join(app_dir(), name)
+
+
+def config_path():
+    return app_path('config.ini')
 
 
 def read_config():
+    """Return the parsed config, parsing the file again only once it has changed"""
+    cfg = config_path()
+    try:
+        stat = os.stat(cfg)
+        version = (stat.st_mtime_ns, stat.st_size)
+    except OSError as e:
+        version = None
+    return parse_config(cfg, version)
+
+
+@functools.lru_cache(maxsize=1)
+def parse_config(path, version):
     try:
-        cfg = config_path()
         parser = configparser.ConfigParser()
-        parser.read([cfg])
+        parser.read([path])
         return parser
     except configparser.Error as e:
         exit(e.message)
@@ -41,8 +91,15 @@ def read_config():
 @click.option('-u', '--url')
 @click.option('-n', '--username')
 @click.option('-p', '--password')
+@click.option('-o', '--output', type=click.Choice(list(reporters)), default='human',
+              help="How to report each time entry: readable text, JSON lines or nothing.")
+@click.option('--tolerance', type=click.IntRange(0), default=0,
+              help="Minutes a duration may differ by and still count as a duplicate.")
+@click.option('--profile', is_flag=True, help="Print time spent per stage and per host when done.")
+@click.option('--profile-json', type=click.Path(dir_okay=False, writable=True),
+              help="Write the profile as JSON to this file when done.")
 @click.pass_context
-def youtrack(ctx, url, username, password):
+def youtrack(ctx, url, username, password, output, tolerance, profile, profile_json):
     """ adds config file and Connection creating object to ctx
 
     This will prepare the context for other commands. It reads the config file
@@ -60,17 +117,102 @@ def youtrack(ctx, url, username, password):
             self.url = url
             self.username = username
             self.password = password
-
-        def create(self):
+            self.password_given = bool(password)
+            self.prompted = False
+            # whether a password may be prompted for, which cron and sync workers must never do
+            self.interactive = True
+            ttl = cfg.getfloat('connection', 'session_hours', fallback=8)
+            self.sessions = SessionCache(app_path('sessions.json'), ttl * 3600) if ttl > 0 else None
+
+        def create(self, use_session=True):
+            """Return a Connection, reusing the last session while it hasn't expired
+
+            Otherwise this logs in with the password from the command line,
+            the keyring or a prompt, in that order, and saves the session.
+            """
+            connection = CachedConnection(self.url, cache)
+            profiler.instrument_http(connection)
+            connection.cached_session = False
+            cookie = self.sessions.get(self.url, self.username) if self.sessions and use_session else None
+            if cookie:
+                connection.headers = {'Cookie': cookie, 'Cache-Control': 'no-cache'}
+                connection.cached_session = True
+                if self.password:
+                    connection._last_credentials = (self.username, self.password)
+                return connection
+
+            password = self.resolve_password()
+            try:
+                connection._login(self.username, password)
+            except yt.YouTrackException as e:
+                if not self.password_given:
+                    delete_password(self.url, self.username)
+                    self.password = None
+                    self.prompted = False
+                raise
+            if self.prompted:
+                set_password(self.url, self.username, password)
+                self.prompted = False
+            if self.sessions:
+                self.sessions.set(self.url, self.username, connection.headers['Cookie'])
+            return connection
+
+        def resolve_password(self):
+            """Return the password from the command line, the keyring or a prompt, in that order
+
+            The password is kept, so later logins don't look for it again.
+
+            Raises:
+                click.ClickException if it would have to be prompted for
+                while not interactive
+            """
+            if not self.password:
+                self.password = get_password(self.url, self.username)
             if not self.password:
+                if not self.interactive:
+                    raise click.ClickException("No password for the YouTrack user {0}, and it can't be prompted "
+                                               "for. Please pass one with --password, or install keyring to "
+                                               "save it.".format(self.username))
                 message = "Please enter the password for the YouTrack user {0}".format(self.username)
                 self.password = click.prompt(message, hide_input=True)
-            return Connection(self.url, self.username, self.password)
+                self.prompted = True
+            return self.password
+
+        def forget(self):
+            """Forget the saved session and password"""
+            if self.sessions:
+                self.sessions.delete(self.url, self.username)
+            delete_password(self.url, self.username)
 
 
     ctx.obj = dict()
     cfg = read_config()
     ctx.obj['cfg'] = cfg
+    ctx.obj['output'] = output
+    ctx.obj['tolerance'] = tolerance
+
+    timezone = cfg.get('import', 'timezone', fallback=None)
+    if timezone:
+        try:
+            Row.timezone = zoneinfo.ZoneInfo(timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError) as e:
+            ctx.fail("Unknown timezone in config import.timezone: {0}".format(timezone))
+    profiler = Profiler()
+    ctx.obj['profiler'] = profiler
+
+    ttls = dict((name, cfg.getint('cache', name + '_ttl')) for name in ResponseCache.default_ttls
+                if cfg.has_option('cache', name + '_ttl'))
+    cache = ResponseCache(int(cfg.getfloat('cache', 'max_mb', fallback=32) * 1024 * 1024), ttls)
+    ctx.obj['cache'] = cache
+
+    if profile or profile_json:
+        def write_profile():
+            if profile:
+                click.echo(profiler.report(), err=True)
+            if profile_json:
+                with open(profile_json, 'w') as fp:
+                    fp.write(profiler.to_json())
+        ctx.call_on_close(write_profile)
 
     if 'config' != ctx.invoked_subcommand:
         try:
@@ -117,189 +259,537 @@ def add(ctx, option, value):
 
 
 @youtrack.command()
-@click.argument('name', nargs=1)
+@click.pass_context
+def logout(ctx):
+    """forgets the saved YouTrack session and password"""
+    ctx.obj['create_connection'].forget()
+
+
+@youtrack.command()
+@click.argument('name', nargs=1, type=click.Choice(list(WorkItemStore.groupings)))
 @click.argument('from_date_string', nargs=1)
 @click.argument('to_date_string', nargs=1)
+@click.option('--user', help="Only count time logged by this YouTrack login.")
+@click.option('--refresh/--no-refresh', default=True,
+              help="Fetch issues updated since the last refresh before reporting.")
 @click.pass_context
-def report(ctx, name, from_date_string, to_date_string):
-    click.echo("Coming Soon!")
-    exit()
+def report(ctx, name, from_date_string, to_date_string, user, refresh):
+    """reports time logged per issue, project or user between two dates
+
+    Work items are kept in a local store in the app dir. Each refresh only
+    fetches the issues updated since the previous one, and the report itself
+    is answered from the store.
+    """
+    try:
+        since = process_datetime(from_date_string)
+        until = process_datetime(to_date_string)
+    except (TypeError, ValueError):
+        ctx.fail("Could not create dates from: {0} {1}".format(from_date_string, to_date_string))
+
+    since = datetime.datetime.combine(since, datetime.time())
+    until = datetime.datetime.combine(until, datetime.time()) + datetime.timedelta(days=1)
+
+    store = WorkItemStore(app_path('work_items.sqlite'))
+    try:
+        if refresh:
+            connection, login = connect(ctx)
+            query = ctx.obj['cfg'].get('report', 'query', fallback="updated: {since} .. Today")
+            refresh_store(store, connection, since.date(), query, profiler=ctx.obj['profiler'])
+        with ctx.obj['profiler'].stage('report'):
+            groups = store.report(name, round(since.timestamp()*1000), round(until.timestamp()*1000), user)
+    finally:
+        store.close()
+
+    if ctx.obj['output'] == 'jsonl':
+        for group, minutes, count in groups:
+            click.echo(json.dumps({name: group, "minutes": minutes, "work_items": count}))
+    elif ctx.obj['output'] == 'human':
+        click.echo("Time logged per {0} from {1:%d/%m/%y} to {2:%d/%m/%y}\n".format(
+            name, since, until - datetime.timedelta(days=1)))
+        for group, minutes, count in groups:
+            click.echo("  {0:<30} {1:>4}h {2:02}m  ({3} work items)".format(group, minutes // 60, minutes % 60, count))
+        total = sum(minutes for group, minutes, count in groups)
+        click.echo("\n  {0:<30} {1:>4}h {2:02}m".format("Total", total // 60, total % 60))
 
 
 @youtrack.command()
-@click.argument('file', type=click.File('rU', 'utf-8-sig'))
+@click.argument('source', nargs=1, type=click.Choice(['manictime', 'toggl']))
+@click.argument('from_date_string', nargs=1)
+@click.argument('to_date_string', nargs=1)
+@click.argument('file', type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option('-w', '--write', 'out', type=click.File('w'), default='-',
+              help="File to write the differences to as CSV, defaults to stdout.")
+@click.option('--user', help="YouTrack login the entries were logged by, defaults to the current user.")
+@click.option('--refresh/--no-refresh', default=True,
+              help="Fetch issues updated since the last refresh before comparing.")
+@click.pass_context
+def reconcile(ctx, source, from_date_string, to_date_string, file, out, user, refresh):
+    """compares time entries with the work items logged in YouTrack
+
+    Entries are read from a ManicTime export FILE, or from Toggl, either
+    from an export FILE or the API if no FILE is given. Only the
+    differences between the dates are written out: entries missing from
+    YouTrack, work items missing from the source, and work items whose
+    duration has changed.
+    """
+    try:
+        since = process_datetime(from_date_string)
+        until = process_datetime(to_date_string)
+    except (TypeError, ValueError):
+        ctx.fail("Could not create dates from: {0} {1}".format(from_date_string, to_date_string))
+
+    since = datetime.datetime.combine(since, datetime.time())
+    until = datetime.datetime.combine(until, datetime.time()) + datetime.timedelta(days=1)
+
+    if file:
+        row_class = ManictimeRow if source == 'manictime' else TogglCSVRow
+        rows = read_csv(ctx, file, row_class)
+    elif source == 'toggl':
+        row_class = TogglAPIRow
+        auth, workspace_id = toggl_auth(ctx)
+        try:
+            rows = toggl_api.fetch_entries(auth, workspace_id, since.date(), (until - datetime.timedelta(days=1)).date(),
+                                           ctx.obj['profiler'], toggl_url(ctx))
+        except requests.RequestException as e:
+            ctx.fail("Could not fetch time entries from Toggl. Error: {0}".format(e))
+    else:
+        ctx.fail("A ManicTime export FILE is needed")
+
+    connection, login = connect(ctx)
+    user = user or login
+    since_ms, until_ms = round(since.timestamp()*1000), round(until.timestamp()*1000)
+    store = WorkItemStore(app_path('work_items.sqlite'))
+    try:
+        if refresh:
+            query = ctx.obj['cfg'].get('report', 'query', fallback="updated: {since} .. Today")
+            refresh_store(store, connection, since.date(), query, profiler=ctx.obj['profiler'])
+        with ctx.obj['profiler'].stage('reconcile'):
+            entries = source_entries([row_class.create(row, connection, user) for row in rows], since_ms, until_ms)
+            differences = reconcile_entries(entries, store.work_items(since_ms, until_ms, user), user,
+                                            ctx.obj['tolerance'])
+    finally:
+        store.close()
+
+    write_differences(differences, out)
+    if ctx.obj['output'] == 'human' and out.name != '<stdout>':
+        click.echo("{0} differences between {1} entries and YouTrack written to {2}".format(
+            len(differences), len(entries), out.name))
+
+
+@youtrack.command()
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
 @click.option('-t', '--test', is_flag=True)
+@click.option('--plan', type=click.File('w'),
+              help="Write the import plan to this file instead of uploading.")
+@click.option('-a', '--aggregate', is_flag=True,
+              help="Merge entries for the same issue, day and author into one work item.")
+@click.option('--rounding', type=click.IntRange(1), default=1,
+              help="Minutes to round merged durations to when aggregating.")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1,
+              help="Number of processes to parse a CSV file with.")
 @click.pass_context
-def manictime(ctx, file, test):
+def manictime(ctx, file, test, plan, aggregate, rounding, jobs):
 
     row_class = ManictimeRow
     try:
-        rows = csv.DictReader(file)
+        rows = read_csv(ctx, file, row_class, jobs)
     except csv.Error as e:
         ctx.fail("Could not find file")
     else:
-        process_rows(list(rows), row_class, ctx, test)
+        rounding = rounding if aggregate else None
+        if plan:
+            plan_rows(rows, row_class, ctx, plan, rounding)
+        else:
+            process_rows(rows, row_class, ctx, test, rounding=rounding)
 
 
 @youtrack.command()
-@click.argument('file', type=click.File('rU', 'utf-8-sig'), required=False)
+@click.argument('file', type=click.Path(exists=True, dir_okay=False), required=False)
 @click.option('-s', '--since', type=click.STRING, default=DateRangeEnum.yesterday.until().format("%Y-%m-%d"))
 @click.option('-u', '--until', type=click.STRING, default=DateRangeEnum.yesterday.until().format("%Y-%m-%d"))
 @click.option('-r', '--range', type=click.Choice([name for name, member in DateRangeEnum.__members__.items()]))
 @click.option('-t', '--test', is_flag=True)
+@click.option('--plan', type=click.File('w'),
+              help="Write the import plan to this file instead of uploading.")
+@click.option('-a', '--aggregate', is_flag=True,
+              help="Merge entries for the same issue, day and author into one work item.")
+@click.option('--rounding', type=click.IntRange(1), default=1,
+              help="Minutes to round merged durations to when aggregating.")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1,
+              help="Number of processes to parse a CSV file with.")
 @click.pass_context
-def toggle(ctx, file, since, until, range, test):
-    toggl_common(ctx, file, since, until, range, test)
+def toggle(ctx, file, since, until, range, test, plan, aggregate, rounding, jobs):
+    toggl_common(ctx, file, since, until, range, test, plan, rounding if aggregate else None, jobs)
 
 
 @youtrack.command()
-@click.argument('file', type=click.File('rU', 'utf-8-sig'), required=False)
+@click.argument('file', type=click.Path(exists=True, dir_okay=False), required=False)
 @click.option('-s', '--since', type=click.STRING, default=DateRangeEnum.yesterday.until().format("%Y-%m-%d"))
 @click.option('-u', '--until', type=click.STRING, default=DateRangeEnum.yesterday.until().format("%Y-%m-%d"))
 @click.option('-r', '--range', type=click.Choice([name for name, member in DateRangeEnum.__members__.items()]))
 @click.option('-t', '--test', is_flag=True)
+@click.option('--plan', type=click.File('w'),
+              help="Write the import plan to this file instead of uploading.")
+@click.option('-a', '--aggregate', is_flag=True,
+              help="Merge entries for the same issue, day and author into one work item.")
+@click.option('--rounding', type=click.IntRange(1), default=1,
+              help="Minutes to round merged durations to when aggregating.")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1,
+              help="Number of processes to parse a CSV file with.")
 @click.pass_context
-def toggl(ctx, file, since, until, range, test):
-    toggl_common(ctx, file, since, until, range, test)
+def toggl(ctx, file, since, until, range, test, plan, aggregate, rounding, jobs):
+    toggl_common(ctx, file, since, until, range, test, plan, rounding if aggregate else None, jobs)
 
 
-def toggl_common(ctx, file, since, until, range, test):
+def toggl_common(ctx, file, since, until, range, test, plan=None, rounding=None, jobs=1):
 
     rows = list()
 
     if file:
         row_class = TogglCSVRow
         try:
-            rows = csv.DictReader(file)
+            rows = read_csv(ctx, file, row_class, jobs)
         except csv.Error as e:
             ctx.fail("Could not find file")
     else:
         row_class = TogglAPIRow
-        params = dict()
-        url = "https://toggl.com/reports/api/v2/details"
-        params['user_agent'] = "matt@outlandish.com"
-        try:
-            token = ctx.obj['cfg'].get('toggl', 'token')
-            workspace_id = ctx.obj['cfg'].get('toggl', 'workspace')
-        except NoOptionError as e:
-            ctx.fail("No configuration set for connection to Toggl. "
-                   "Please add your api token and workspace id to the config by using the following commands:\n\n"
-                   "youtrack config add toggl.token <api_token>\n"
-                   "youtrack config add toggl.workspace <workspace_id>\n")
-        else:
-            auth = (token, "api_token")
-            params['workspace_id'] = workspace_id
-
+        auth, workspace_id = toggl_auth(ctx)
+        if auth:
             if range:
                 times = [member for name, member in DateRangeEnum.__members__.items() if name == range]
-                params['since'] = times[0].since()
-                params['until'] = times[0].until()
+                since = times[0].since()
+                until = times[0].until()
             else:
                 try:
-                    params['until'] = process_datetime(until)
+                    until = process_datetime(until)
                 except TypeError:
                     ctx.fail("Could not create a date from --until option: {0}".format(until))
 
                 try:
-                    params['since'] = process_datetime(since)
+                    since = process_datetime(since)
                 except TypeError:
                     ctx.fail("Could not create a date from --since option: {0}".format(since))
 
             try:
-                result = requests.get(url, auth=auth, params=params)
-            except requests.ConnectionError as e:
-                ctx.fail("Could not connect to Toggl. Error: {0}".format(e))
-            else:
-                rows = result.json()['data']
+                rows = toggl_api.fetch_entries(auth, workspace_id, since, until, ctx.obj['profiler'], toggl_url(ctx))
+            except requests.RequestException as e:
+                ctx.fail("Could not fetch time entries from Toggl. Error: {0}".format(e))
+
+    if plan:
+        plan_rows(rows, row_class, ctx, plan, rounding)
+        return
 
-    process_rows(rows, row_class, ctx, test)
+    process_rows(rows, row_class, ctx, test, rounding=rounding)
 
     if len(row_class.ids) and row_class == TogglAPIRow:
-        ids = [str(id) for id in row_class.ids]
-        url = "https://www.toggl.com/api/v8/time_entries/{0}".format(",".join(ids))
-        data = {"time_entry": {"tags": ["youtracked"], "tag_action": "add"}}
-        try:
-            requests.put(url, auth=auth, data=json.dumps(data))
-        except requests.ConnectionError as e:
-            ctx.fail("Could not update Toggl: {0}".format(e))
+        tag_toggl_entries(ctx, row_class.ids)
+
+
+def read_csv(ctx, path, row_class, jobs=1):
+    """Return the rows of a CSV export, parsed across jobs processes if more than one
+
+    Only the columns the row class reads are decoded.
+    """
+    if jobs > 1:
+        with ctx.obj['profiler'].stage('parse_parallel'):
+            return parse_file(path, row_class, jobs)
+    with ctx.obj['profiler'].stage('fetch'), MappedCSVReader(path, row_class.csv_columns) as reader:
+        return list(reader)
+
+
+def toggl_auth(ctx):
+    """Return the auth tuple and workspace id for the Toggl API from the config"""
+    try:
+        token = ctx.obj['cfg'].get('toggl', 'token')
+        workspace_id = ctx.obj['cfg'].get('toggl', 'workspace')
+    except NoOptionError as e:
+        ctx.fail("No configuration set for connection to Toggl. "
+               "Please add your api token and workspace id to the config by using the following commands:\n\n"
+               "youtrack config add toggl.token <api_token>\n"
+               "youtrack config add toggl.workspace <workspace_id>\n")
+    else:
+        return (token, "api_token"), workspace_id
+
+
+def toggl_url(ctx):
+    """Return the base url set in toggl.url, eg. for a local stand-in for Toggl, or None"""
+    return ctx.obj['cfg'].get('toggl', 'url', fallback=None)
+
+
+def tag_toggl_entries(ctx, ids):
+    """Tag the Toggl time entries with the given ids as youtracked"""
+    auth, workspace_id = toggl_auth(ctx)
+    try:
+        toggl_api.tag_entries(auth, ids, ctx.obj['profiler'], toggl_url(ctx))
+    except requests.RequestException as e:
+        ctx.fail("Could not update Toggl: {0}".format(e))
+
+
+@youtrack.command()
+@click.argument('file', type=click.File('r'))
+@click.option('-t', '--test', is_flag=True)
+@click.option('--update-conflicts', is_flag=True,
+              help="Update the work items conflicting entries overlap, without asking.")
+@click.pass_context
+def apply(ctx, file, test, update_conflicts):
+    """uploads the time entries planned with --plan
+
+    Only entries planned as "create" or "conflict" are uploaded, and they
+    are not checked for duplicates again. A conflicting entry updates the
+    work item it overlaps, if confirmed and if it was the only one it
+    overlapped when planned. Toggl entries are tagged as
+    youtracked afterwards.
+    """
+    try:
+        plan = Plan.load(file)
+    except ValueError as e:
+        ctx.fail("Could not read plan: {0}".format(e))
+    else:
+        entries = [entry for entry in plan.entries if entry['status'] in (Plan.CREATE, Plan.CONFLICT)]
+        process_rows(entries, PlannedRow, ctx, test, check_duplicates=False, update_conflicts=update_conflicts)
+
+        if len(PlannedRow.ids) and plan.source == TogglAPIRow.__name__:
+            tag_toggl_entries(ctx, PlannedRow.ids)
+
+
+@youtrack.group(invoke_without_command=True)
+@click.option('--once', is_flag=True, help="Run the jobs that are due then exit, eg. when run from cron.")
+@click.option('--interval', type=click.IntRange(1),
+              help="Minutes between imports of each source, defaults to sync.interval or 15.")
+@click.option('--workers', type=click.IntRange(1),
+              help="Number of jobs run at once, defaults to sync.workers or 2.")
+@click.pass_context
+def sync(ctx, once, interval, workers):
+    """imports time entries from each configured source on a schedule
+
+    Sources are set as a comma separated list, eg.
+
+    youtrack config add sync.sources "toggl, manictime:/path/to/export.csv"
+
+    Jobs are queued in the app dir, so a stopped service picks up where it
+    left off. Entries whose issue can't be found are never prompted for,
+    and entries overlapping a work item are never updated. Both are
+    recorded and listed by "youtrack sync unresolved".
+    """
+    if ctx.invoked_subcommand:
+        return
+    cfg = ctx.obj['cfg']
+    sources = [source.strip() for source in cfg.get('sync', 'sources', fallback="toggl").split(",") if source.strip()]
+    interval = interval or cfg.getint('sync', 'interval', fallback=15)
+    workers = workers or cfg.getint('sync', 'workers', fallback=2)
+    auth = toggl_auth(ctx) if any(source.partition(":")[0] == "toggl" for source in sources) else None
+
+    lock = SyncLock(app_path('sync.lock'))
+    if not lock.acquire():
+        ctx.fail("Another youtrack sync is already running")
+    # logs in now, on the main thread, only if there is no saved session; a password is only
+    # prompted for from a terminal, never from cron or a worker
+    connection_manager = ctx.obj['create_connection']
+    connection_manager.interactive = sys.stdin.isatty()
+    connect(ctx)
+    connection_manager.interactive = False
+
+    def on_finish(job, result):
+        if ctx.obj['output'] == 'jsonl':
+            event = {'job': job.id, 'source': job.source, 'attempt': job.attempts}
+            if isinstance(result, Exception):
+                event['error'] = str(result)
+            else:
+                event['counts'] = result
+            click.echo(json.dumps(event))
+        elif ctx.obj['output'] == 'human':
+            if isinstance(result, Exception):
+                click.echo("Sync of {0} failed (attempt {1}): {2}".format(job.source, job.attempts, result), err=True)
+            else:
+                click.echo("Synced {0}: {1}.".format(job.source, ", ".join(
+                    "{0} {1}".format(status, result[status]) for status in Plan.statuses + ('untagged',)
+                    if status in result)))
+
+    queue = JobQueue(app_path('sync.sqlite'))
+    importer = Importer(lambda: connect(ctx), queue, auth, Backpressure(), ctx.obj['profiler'], ctx.obj['tolerance'],
+                        toggl_url(ctx))
+    service = SyncService(queue, Scheduler(queue, sources, interval * 60), importer, workers, on_finish=on_finish)
+    try:
+        service.run(once)
+    except KeyboardInterrupt as e:
+        click.echo("Stopped, unfinished jobs will be run next time.", err=True)
+    finally:
+        queue.close()
+        lock.release()
+
+
+@sync.command()
+@click.option('--clear', is_flag=True, help="Forget the recorded entries once listed.")
+@click.pass_context
+def unresolved(ctx, clear):
+    """lists time entries sync could not find an issue for, or that overlap a work item"""
+    queue = JobQueue(app_path('sync.sqlite'))
+    try:
+        for source, status, issue_id, label in queue.unresolved():
+            if ctx.obj['output'] == 'jsonl':
+                click.echo(json.dumps({'source': source, 'status': status, 'issue_id': issue_id, 'label': label}))
+            elif ctx.obj['output'] == 'human':
+                click.echo("{0}: {1} ({2}, {3})".format(source, label, issue_id or "no issue id", status))
+        if clear:
+            queue.clear_unresolved()
+    finally:
+        queue.close()
 
 
 def process_datetime(date_string):
     cal = Calendar()
     try:
         dt = date_parse(date_string)
-    except TypeError:
+    except (TypeError, ValueError):
         dt = cal.nlp(date_string)[0][0]
     return dt
 
 
-def process_rows(rows, row_class, ctx, test=False):
-
+def connect(ctx):
+    """Return the YouTrack connection and the login of the current user"""
     try:
-        connection_manager = ctx.obj['create_connection']
-        connection = connection_manager.create()
-        """ get the login for the current user (may have used email to login with) """
-        userXml = connection._get('/user/current')
-        userNode = userXml.getElementsByTagName('user')
-        login = userNode[0].attributes['login'].value
+        with ctx.obj['profiler'].stage('login'):
+            connection_manager = ctx.obj['create_connection']
+            connection = connection_manager.create()
+            """ get the login for the current user (may have used email to login with) """
+            try:
+                userXml = connection.current_user()
+            except yt.YouTrackException as e:
+                # the saved session has expired, so log in again
+                if not connection.cached_session or e.response.status not in (401, 403):
+                    raise
+                connection = connection_manager.create(use_session=False)
+                userXml = connection.current_user()
+            userNode = userXml.getElementsByTagName('user')
+            login = userNode[0].attributes['login'].value
     except yt.YouTrackException as e:
         ctx.fail(e)
     else:
-        try:
-            total = len(rows)
-        except TypeError as e:
-            click.echo("Could not get total number of rows.")
-            total = 0
-        ignored = 0
-        created = 0
-        duplicate = 0
-        error = 0
-
-        click.echo("\nProcessing {0} time entries. Please wait\n".format(total))
-
-        for row in rows:
-            row = row_class(row, connection, login)
-            row_string = row.__str__()
-            if row.is_ignored():
-                click.echo("Ignored: Time Entry for {0}\n".format(row_string))
-                ignored += 1
-                continue
-            while True:
-                if row.work_item_exists():
-                    click.echo("Duplicate: Time Entry for {0}\n".format(row_string))
-                    duplicate += 1
-                    break
-                try:
-                    if not test:
-                        row.save_work_item()
-                except YoutrackIssueNotFoundException as e:
-                    click.echo("Could not upload Time Entry for {0}".format(row_string))
-                    click.echo("  Error: No Issue found or Issue Id incorrect\n")
-                    if click.confirm("  Do you wish to ignore this issue?"):
-                        click.echo("Ignored: Time Entry for {0}\n".format(row_string))
-                        ignored += 1
-                        break
-                    row.issue_id = click.prompt("  Please provide the correct Issue Id")
-                except YoutrackMissingConnectionException as e:
-                    click.echo("Could not upload Time Entry for {0}".format(row_string))
-                    ctx.fail("  Error: YouTrack connection is missing method to create Time Entry")
-                except yt.YouTrackException as e:
-                    click.echo("Could not upload Time Entry for {0}".format(row_string))
-                    ctx.fail("  Error: Unable to connect to YouTrack")
-                except YoutrackWorkItemIncorrectException as e:
-                    click.echo("Could not upload Time Entry for {0}".format(row_string))
-                    click.echo("  Error: Unable to create Time Entry. Missing important properties\n")
-                    error += 1
-                    break
+        return connection, login
+
+
+def plan_rows(rows, row_class, ctx, file, rounding=None):
+    """Work out what importing the rows would do and write the plan to file"""
+    connection, login = connect(ctx)
+    plan = Planner(connection, login, ctx.obj['profiler'], ctx.obj['tolerance']).plan(rows, row_class, rounding=rounding)
+    plan.save(file)
+    if ctx.obj['output'] == 'human':
+        counts = plan.counts()
+        click.echo("Planned {0} time entries.".format(len(plan.entries)))
+        for status in Plan.statuses:
+            click.echo("  {0}: {1}.".format(status.capitalize(), counts[status]))
+        click.echo("Apply it with: youtrack apply {0}".format(file.name))
+
+
+def process_rows(rows, row_class, ctx, test=False, check_duplicates=True, rounding=None, update_conflicts=False):
+
+    profiler = ctx.obj['profiler']
+    reporter = create_reporter(ctx.obj['output'])
+    connection, login = connect(ctx)
+    if rounding:
+        with profiler.stage('aggregate'):
+            rows = aggregate([row_class.create(row, connection, login) for row in rows], connection, login, rounding)
+    try:
+        total = len(rows)
+    except TypeError as e:
+        click.echo("Could not get total number of rows.", err=True)
+        total = 0
+    counts = dict.fromkeys(reporter.statuses, 0)
+    # each issue's work items are fetched and indexed once, then reused for every row
+    planner = Planner(connection, login, profiler, ctx.obj['tolerance'])
+
+    reporter.start(total)
+
+    for row in rows:
+        with profiler.stage('parse'):
+            row = row_class.create(row, connection, login)
+            ignored_row = row.is_ignored()
+            if not ignored_row:
+                # the WorkItem is built lazily, so build it here for its parsing to be counted as parse
+                row.work_item
+        if ignored_row:
+            reporter.entry("ignored", row)
+            counts["ignored"] += 1
+            continue
+        while True:
+            work_items = None
+            if check_duplicates and row.issue_id:
+                planner.prefetch([row.issue_id])
+                work_items = planner.work_items[row.issue_id]
+            with profiler.stage('work_item_exists'):
+                exists = work_items is not None and row.is_duplicate_of(work_items, ctx.obj['tolerance'])
+            if exists:
+                reporter.entry("duplicate", row)
+                counts["duplicate"] += 1
+                break
+            with profiler.stage('find_conflict'):
+                if work_items is not None:
+                    conflicts = planner.conflicts(row)
+                    conflict = planner.update_target(row, conflicts)
+                elif check_duplicates:
+                    # the issue couldn't be fetched
+                    conflicts, conflict = [], None
                 else:
-                    click.echo("Created: Time Entry for {0}\n".format(row_string))
-                    created += 1
+                    # a planned row carries the conflicts found when planning, and the one it may update
+                    conflicts = row.conflicting_work_items()
+                    conflict = row.conflicting_work_item()
+                    if conflict is not None:
+                        conflict = planner.update_target(row, [conflict])
+            if conflicts and conflict is None:
+                # never updated in place, whatever update_conflicts says
+                reporter.entry("conflict", row, "Overlaps {0} work items".format(len(conflicts))
+                               if len(conflicts) > 1 else "Overlaps a work item already written by this import")
+                counts["conflict"] += 1
+                break
+            if conflict is not None and not update_conflicts and not (reporter.interactive and click.confirm(
+                    "Time Entry for {0} overlaps an existing work item. Do you wish to update it instead?".format(row))):
+                reporter.entry("conflict", row)
+                counts["conflict"] += 1
+                break
+            try:
+                if not test:
+                    if conflict is not None:
+                        with profiler.stage('update_work_item'):
+                            row.update_work_item(conflict)
+                        # the indexes no longer match the work item updated
+                        planner.forget(row.issue_id)
+                    else:
+                        with profiler.stage('save_work_item'):
+                            row.save_work_item()
+            except YoutrackIssueNotFoundException as e:
+                if not reporter.interactive:
+                    reporter.entry("unresolved", row, "No Issue found or Issue Id incorrect")
+                    counts["unresolved"] += 1
+                    break
+                click.echo("Could not upload Time Entry for {0}".format(row))
+                click.echo("  Error: No Issue found or Issue Id incorrect\n")
+                if click.confirm("  Do you wish to ignore this issue?"):
+                    reporter.entry("ignored", row)
+                    counts["ignored"] += 1
                     break
-        click.echo("Processed {0} time entries.".format(total))
-        click.echo("  Ignored: {0}.".format(ignored))
-        click.echo("  Error: {0}.".format(error))
-        click.echo("  Duplicate: {0}.".format(duplicate))
-        click.echo("  Created: {0}.".format(created))
+                row.issue_id = click.prompt("  Please provide the correct Issue Id")
+            except YoutrackMissingConnectionException as e:
+                reporter.fatal(row, "YouTrack connection is missing method to create Time Entry")
+                ctx.fail("  Error: YouTrack connection is missing method to create Time Entry")
+            except yt.YouTrackException as e:
+                reporter.fatal(row, "Unable to connect to YouTrack")
+                ctx.fail("  Error: Unable to connect to YouTrack")
+            except YoutrackWorkItemIncorrectException as e:
+                reporter.entry("error", row, "Unable to create Time Entry. Missing important properties")
+                counts["error"] += 1
+                break
+            else:
+                # so no later row in the import updates it again
+                planner.claim(row, conflict)
+                if work_items is not None and conflict is None:
+                    # a repeated entry later in the import is then a duplicate
+                    work_items.add_work_item(row.work_item, login)
+                status = "created" if conflict is None else "updated"
+                reporter.entry(status, row)
+                counts[status] += 1
+                break
+    reporter.summary(total, counts, ctx.obj['cache'].stats())
+    reporter.close()
 
 if __name__ == "__main__":
     youtrack()
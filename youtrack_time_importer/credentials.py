@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import keyring
+    from keyring.errors import KeyringError
+except ImportError:
+    keyring = None
+
+SERVICE = "youtrack-time-importer"
+
+
+def credential_key(url, username):
+    return "{0}@{1}".format(username, url.rstrip('/'))
+
+
+def get_password(url, username):
+    """Return the password saved in the OS keyring, or None
+
+    Passwords are only ever kept in the keyring, which needs the optional
+    keyring package. Without it None is always returned.
+    """
+
+    if keyring is None:
+        return None
+    try:
+        return keyring.get_password(SERVICE, credential_key(url, username))
+    except KeyringError as e:
+        return None
+
+
+def set_password(url, username, password):
+    """Save the password in the OS keyring, returning False if there isn't one"""
+
+    if keyring is None:
+        return False
+    try:
+        keyring.set_password(SERVICE, credential_key(url, username), password)
+    except KeyringError as e:
+        return False
+    return True
+
+
+def delete_password(url, username):
+    if keyring is None:
+        return
+    try:
+        keyring.delete_password(SERVICE, credential_key(url, username))
+    except KeyringError as e:
+        pass
+
+
+class SessionCache(object):
+    """YouTrack session cookies kept between runs until they expire
+
+    Logging in once per session rather than once per command saves the
+    login request, and the password prompt when it isn't in the keyring.
+    The cookies are kept in a JSON file only the current user can read.
+    """
+
+    def __init__(self, path, ttl=8 * 3600):
+        """
+        Args:
+            ttl: seconds a session is used for after logging in
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def load(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            with open(self.path, 'r') as fp:
+                sessions = json.load(fp)
+        except (OSError, ValueError) as e:
+            return dict()
+        return dict((key, session) for key, session in sessions.items() if session.get('expires', 0) > now)
+
+    def save(self, sessions):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(sessions, fp)
+        os.chmod(self.path, 0o600)
+
+    def get(self, url, username, now=None):
+        """Return the session cookie for the user, or None if there isn't one or it has expired"""
+
+        with self.lock:
+            session = self.load(now).get(credential_key(url, username))
+        return session['cookie'] if session else None
+
+    def set(self, url, username, cookie, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            sessions = self.load(now)
+            sessions[credential_key(url, username)] = {'cookie': cookie, 'expires': now + self.ttl}
+            self.save(sessions)
+
+    def delete(self, url, username):
+        with self.lock:
+            sessions = self.load()
+            if sessions.pop(credential_key(url, username), None) is not None:
+                self.save(sessions)
@@ -0,0 +1,389 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from xml.dom import minidom
+from xml.parsers.expat import ExpatError
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+import click
+import datetime
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+
+WORK_ITEMS_PATH = re.compile(r"^/rest/issue/(?P<issue_id>[^/]+)/timetracking/workitem/?$")
+WORK_ITEM_PATH = re.compile(r"^/rest/issue/(?P<issue_id>[^/]+)/timetracking/workitem/(?P<id>[^/]+)$")
+TIME_ENTRIES_PATH = re.compile(r"^/api/v8/time_entries/(?P<ids>[0-9,]+)$")
+
+
+class RateLimiter(object):
+    """token bucket allowing rate requests per second, in bursts of up to rate"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class FakeServer(ThreadingHTTPServer):
+    """a local stand-in for YouTrack and Toggl, for load testing offline
+
+    It serves the parts of the YouTrack REST API used by
+    youtrack.connection.Connection (login, current user, issue search and
+    work items) and the Toggl details report and time entry tagging, all
+    from memory. Point the config at it with:
+
+    youtrack config add connection.url http://127.0.0.1:8111
+    youtrack config add toggl.url http://127.0.0.1:8111
+
+    Latency, errors and rate limiting are applied to every request except
+    the login, using a seeded random generator so runs can be repeated.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 page_size=50, rate_limit=None, seed=None, username="matt", password=None):
+        """
+        Args:
+            latency: seconds added to every response
+            jitter: up to this many more seconds added at random
+            error_rate: fraction of requests answered with error_status
+            page_size: Toggl report entries per page
+            rate_limit: requests per second allowed before answering 429
+            password: the YouTrack password, any password is accepted if None
+        """
+
+        super().__init__(address, FakeRequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.page_size = page_size
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.random = random.Random(seed)
+        self.username = username
+        self.password = password
+        self.sessions = set()
+        self.issues = dict()
+        self.entries = []
+        self.lock = threading.Lock()
+        self.stats = dict(requests=0, errors=0, rate_limited=0)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def start(self):
+        """Serve from a background thread, returning the server"""
+
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def add_issue(self, issue_id):
+        with self.lock:
+            return self.issues.setdefault(issue_id, [])
+
+    def add_work_item(self, issue_id, date, duration, description=None, author=None):
+        """Add a work item to an existing issue and return it as a dict"""
+
+        with self.lock:
+            work_item = dict(id=uuid.uuid4().hex[:12], date=str(date), duration=str(duration),
+                             description=description, author=author or self.username)
+            self.issues[issue_id].append(work_item)
+            return work_item
+
+    def add_entry(self, description, start, seconds, tags=None):
+        """Add a Toggl time entry starting at the aware datetime start"""
+
+        with self.lock:
+            entry = dict(id=len(self.entries) + 1, description=description, start=start.isoformat(),
+                         end=(start + datetime.timedelta(seconds=seconds)).isoformat(), dur=int(seconds * 1000),
+                         user=self.username, tags=list(tags or []))
+            self.entries.append(entry)
+            return entry
+
+    def populate(self, issues=10, work_items=5, entries=200, days=7):
+        """Fill the server with random issues, work items and time entries
+
+        Issues are FAKE-1 to FAKE-<issues>. About one time entry in ten
+        names an issue which doesn't exist, so it can't be resolved.
+        """
+
+        today = datetime.datetime.now(datetime.timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0)
+        for number in range(1, issues + 1):
+            self.add_issue("FAKE-{0}".format(number))
+            for i in range(work_items):
+                start = today - datetime.timedelta(days=self.random.randrange(days), minutes=self.random.randrange(480))
+                self.add_work_item("FAKE-{0}".format(number), int(start.timestamp() * 1000),
+                                   self.random.randrange(5, 120), "Earlier work")
+        for i in range(entries):
+            number = self.random.randrange(1, issues + 1) if self.random.random() > 0.1 else issues + 1
+            start = today - datetime.timedelta(days=self.random.randrange(days), minutes=self.random.randrange(480))
+            self.add_entry("FAKE-{0} Work on feature {1}".format(number, i), start, self.random.randrange(60, 7200))
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def delay(self):
+        with self.lock:
+            seconds = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if seconds:
+            time.sleep(seconds)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which with Nagle's algorithm
+    # and delayed acks would add ~40ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def handle_request(self, method):
+        server = self.server
+        parsed = urllib.parse.urlsplit(self.path)
+        self.query = dict(urllib.parse.parse_qsl(parsed.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        server.count('requests')
+        if method == 'POST' and parsed.path == "/rest/user/login":
+            return self.login()
+
+        server.delay()
+        if server.limiter and not server.limiter.allow():
+            server.count('rate_limited')
+            return self.send_error_message(parsed.path, 429, "Too Many Requests", {'Retry-After': "1"})
+        if server.should_fail():
+            server.count('errors')
+            return self.send_error_message(parsed.path, server.error_status, "Injected error")
+
+        if parsed.path.startswith("/rest/"):
+            if not self.has_session():
+                return self.send(401, b"<error>Unauthorized</error>", "application/xml")
+            match = WORK_ITEMS_PATH.match(parsed.path)
+            if method == 'GET' and parsed.path == "/rest/user/current":
+                return self.current_user()
+            if method == 'GET' and parsed.path == "/rest/issue":
+                return self.issues()
+            if match and method == 'GET':
+                return self.work_items(urllib.parse.unquote(match.group('issue_id')))
+            if match and method == 'POST':
+                return self.create_work_item(urllib.parse.unquote(match.group('issue_id')))
+            match = WORK_ITEM_PATH.match(parsed.path)
+            if match and method == 'PUT':
+                return self.update_work_item(urllib.parse.unquote(match.group('issue_id')), match.group('id'))
+        elif parsed.path.startswith("/reports/api/v2/") or parsed.path.startswith("/api/v8/"):
+            if not self.headers.get('Authorization'):
+                return self.send(403, b"", "text/plain")
+            match = TIME_ENTRIES_PATH.match(parsed.path)
+            if method == 'GET' and parsed.path == "/reports/api/v2/details":
+                return self.details()
+            if match and method == 'PUT':
+                return self.tag_entries([int(id) for id in match.group('ids').split(",")])
+        return self.send(404, b"<error>Not found</error>", "application/xml")
+
+    def send(self, status, content, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_error_message(self, path, status, message, headers=None):
+        # the youtrack client can only read errors sent as XML, like YouTrack sends them
+        if path.startswith("/rest/"):
+            return self.send_xml("<error>{0}</error>".format(escape(message)), status, headers)
+        self.send(status, message.encode('utf-8'), "text/plain", headers)
+
+    def send_json(self, data, status=200):
+        self.send(status, json.dumps(data).encode('utf-8'), "application/json")
+
+    def send_xml(self, xml, status=200, headers=None):
+        self.send(status, xml.encode('utf-8'), "application/xml; charset=UTF-8", headers)
+
+    def has_session(self):
+        cookie = self.headers.get('Cookie') or ""
+        return any(part.strip() in self.server.sessions for part in cookie.split(";"))
+
+    def login(self):
+        form = dict(urllib.parse.parse_qsl(self.body.decode('utf-8')))
+        server = self.server
+        if form.get('login') != server.username or (server.password is not None
+                                                     and form.get('password') != server.password):
+            return self.send_xml("<error>Incorrect login or password.</error>", 403)
+        session = "YTSESSION={0}".format(uuid.uuid4().hex)
+        with server.lock:
+            server.sessions.add(session)
+        self.send_xml("<login>ok</login>", headers={'Set-Cookie': session + "; Path=/"})
+
+    def current_user(self):
+        self.send_xml("<user login={0} email={1}/>".format(
+            quoteattr(self.server.username), quoteattr(self.server.username + "@example.com")))
+
+    def issues(self):
+        after = int(self.query.get('after', 0))
+        count = int(self.query.get('max', 100))
+        with self.server.lock:
+            issue_ids = sorted(self.server.issues)[after:after + count]
+        self.send_xml("<issues>{0}</issues>".format(
+            "".join("<issue id={0}/>".format(quoteattr(issue_id)) for issue_id in issue_ids)))
+
+    def work_item_url(self, issue_id, work_item):
+        return "{0}/rest/issue/{1}/timetracking/workitem/{2}".format(
+            self.server.url, urllib.parse.quote(issue_id), work_item['id'])
+
+    def work_items(self, issue_id):
+        with self.server.lock:
+            work_items = self.server.issues.get(issue_id)
+            work_items = list(work_items) if work_items is not None else None
+        if work_items is None:
+            return self.send_xml("<error>Issue not found.</error>", 404)
+        xml = "".join(
+            "<workItem url={url}><id>{id}</id><date>{date}</date><duration>{duration}</duration>"
+            "{description}<author login={author}/></workItem>".format(
+                url=quoteattr(self.work_item_url(issue_id, work_item)), id=work_item['id'],
+                date=work_item['date'], duration=work_item['duration'], author=quoteattr(work_item['author']),
+                description="<description>{0}</description>".format(escape(work_item['description']))
+                if work_item['description'] is not None else "")
+            for work_item in work_items)
+        self.send_xml("<workItems>{0}</workItems>".format(xml))
+
+    def read_work_item(self):
+        """Return the date, duration and description of the work item XML sent, or None if invalid"""
+
+        try:
+            root = minidom.parseString(self.body).documentElement
+            values = dict((e.tagName, "".join(n.data for n in e.childNodes if n.nodeType == n.TEXT_NODE))
+                          for e in root.childNodes if e.nodeType == e.ELEMENT_NODE)
+            return int(values['date']), int(values['duration']), values.get('description')
+        except (ExpatError, KeyError, ValueError) as e:
+            return None
+
+    def create_work_item(self, issue_id):
+        if issue_id not in self.server.issues:
+            return self.send_xml("<error>Issue not found.</error>", 404)
+        values = self.read_work_item()
+        if values is None:
+            return self.send_xml("<error>Invalid work item.</error>", 400)
+        work_item = self.server.add_work_item(issue_id, *values)
+        self.send(201, b"", "application/xml", {'Location': self.work_item_url(issue_id, work_item)})
+
+    def update_work_item(self, issue_id, id):
+        values = self.read_work_item()
+        if values is None:
+            return self.send_xml("<error>Invalid work item.</error>", 400)
+        with self.server.lock:
+            work_item = next((work_item for work_item in self.server.issues.get(issue_id, ())
+                              if work_item['id'] == id), None)
+            if work_item is not None:
+                work_item.update(date=str(values[0]), duration=str(values[1]), description=values[2])
+        if work_item is None:
+            return self.send_xml("<error>Work item not found.</error>", 404)
+        self.send(200, b"", "application/xml")
+
+    def details(self):
+        page = max(1, int(self.query.get('page', 1)))
+        since = self.query.get('since')
+        until = self.query.get('until')
+        with self.server.lock:
+            entries = [entry for entry in self.server.entries
+                       if (not since or entry['start'][:10] >= since) and (not until or entry['start'][:10] <= until)]
+        per_page = self.server.page_size
+        self.send_json({
+            'total_count': len(entries),
+            'per_page': per_page,
+            'total_pages': int(math.ceil(len(entries) / per_page)) if per_page else 1,
+            'data': entries[(page - 1) * per_page:page * per_page],
+        })
+
+    def tag_entries(self, ids):
+        try:
+            data = json.loads(self.body.decode('utf-8'))['time_entry']
+        except (ValueError, KeyError) as e:
+            return self.send_json({'error': "Invalid time entry"}, 400)
+        tagged = []
+        with self.server.lock:
+            for entry in self.server.entries:
+                if entry['id'] in ids:
+                    entry['tags'] = sorted(set(entry['tags']) | set(data.get('tags', [])))
+                    tagged.append(entry)
+        self.send_json({'data': tagged})
+
+
+@click.command()
+@click.option('--host', default="127.0.0.1")
+@click.option('--port', type=click.IntRange(0), default=8111)
+@click.option('--latency', type=click.FloatRange(0), default=0.0, help="Seconds added to every response.")
+@click.option('--jitter', type=click.FloatRange(0), default=0.0, help="Up to this many more seconds, at random.")
+@click.option('--error-rate', type=click.FloatRange(0, 1), default=0.0, help="Fraction of requests that fail.")
+@click.option('--error-status', type=click.IntRange(400, 599), default=503)
+@click.option('--page-size', type=click.IntRange(1), default=50, help="Toggl report entries per page.")
+@click.option('--rate-limit', type=click.IntRange(1), help="Requests per second before answering 429.")
+@click.option('--issues', type=click.IntRange(0), default=10)
+@click.option('--work-items', type=click.IntRange(0), default=5, help="Work items already logged per issue.")
+@click.option('--entries', type=click.IntRange(0), default=200, help="Toggl time entries.")
+@click.option('--seed', type=click.INT, help="Seed for the generated data, latency and errors.")
+@click.option('--username', default="matt")
+@click.option('--password', help="YouTrack password to accept, any by default.")
+def main(host, port, latency, jitter, error_rate, error_status, page_size, rate_limit, issues, work_items, entries,
+         seed, username, password):
+    """serves a fake YouTrack and Toggl until interrupted"""
+    server = FakeServer((host, port), latency, jitter, error_rate, error_status, page_size, rate_limit, seed,
+                        username, password)
+    server.populate(issues, work_items, entries)
+    click.echo("Serving fake YouTrack and Toggl on {0}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt as e:
+        click.echo(json.dumps(server.stats))
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
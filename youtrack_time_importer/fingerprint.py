@@ -0,0 +1,90 @@
+import bisect
+import hashlib
+
+
+def fingerprint(author, date, minutes, source_id=None):
+    """Return a 64 bit integer identifying a work item
+
+    Args:
+        author: the YouTrack login of the work item's author
+        date: the start of the work item in epoch milliseconds
+        minutes: the duration of the work item in minutes
+        source_id: optional id of the entry in its source (eg. Toggl)
+
+    The hash is the same on every machine and every run, so it can be
+    saved in a plan or a store and compared later.
+    """
+
+    key = "{0}\x1f{1}\x1f{2}\x1f{3}".format(author or "", int(date), int(minutes),
+                                            "" if source_id is None else source_id)
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def work_item_key(author, date, minutes):
+    """Return the key a work item is looked up by when finding duplicates
+
+    Unlike a fingerprint it is never saved, so a plain tuple, which is
+    cheaper to build and hash, is enough.
+    """
+
+    return author or "", int(date), int(minutes)
+
+
+def work_item_fingerprint(work_item, author=None):
+    """Return the fingerprint of a YouTrack WorkItem, without any source id"""
+
+    return fingerprint(author or getattr(work_item, 'authorLogin', None), work_item.date, work_item.duration)
+
+
+class FingerprintIndex(object):
+    """index of work items for finding duplicates
+
+    Exact duplicates are found with a set lookup on their work_item_key.
+    With a tolerance, a sorted list of (date, minutes) per author is
+    searched instead, so a duration that drifted by rounding still
+    matches without comparing against every work item.
+    """
+
+    def __init__(self, work_items=()):
+        self.keys = set()
+        self.sorted = dict()
+        for work_item in work_items:
+            key = work_item_key(getattr(work_item, 'authorLogin', None), work_item.date, work_item.duration)
+            self.keys.add(key)
+            self.sorted.setdefault(key[0], []).append(key[1:])
+        # sorted once here, rather than inserting each work item in order
+        for items in self.sorted.values():
+            items.sort()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, author, date, minutes):
+        key = work_item_key(author, date, minutes)
+        self.keys.add(key)
+        bisect.insort(self.sorted.setdefault(key[0], []), key[1:])
+
+    def add_work_item(self, work_item, author=None):
+        self.add(author or getattr(work_item, 'authorLogin', None), work_item.date, work_item.duration)
+
+    def contains(self, author, date, minutes, tolerance=0):
+        """Return True if a work item by author with this date and duration is indexed
+
+        Args:
+            tolerance: the number of minutes the duration may differ by
+        """
+
+        return self.contains_key(work_item_key(author, date, minutes), tolerance)
+
+    def contains_key(self, key, tolerance=0):
+        """Return True if a work item with this work_item_key is indexed"""
+
+        if not tolerance:
+            return key in self.keys
+        author, date, minutes = key
+        items = self.sorted.get(author, [])
+        i = bisect.bisect_left(items, (date, minutes - tolerance))
+        return i < len(items) and items[i] <= (date, minutes + tolerance)
+
+    def contains_work_item(self, work_item, author, tolerance=0):
+        return self.contains(author, work_item.date, work_item.duration, tolerance)
@@ -0,0 +1,97 @@
+import bisect
+
+MINUTE_MS = 60 * 1000
+
+
+class IntervalIndex(object):
+    """index of the time spans of work items, for finding overlaps
+
+    Each author's work items are kept sorted by start, with a running
+    maximum of their ends. The first work item overlapping a span is
+    then found with two binary searches, however many work items the
+    issue has.
+    """
+
+    def __init__(self, work_items=()):
+        self.starts = dict()
+        self.items = dict()
+        self.ends = dict()
+        self.max_ends = dict()
+        spans = dict()
+        for work_item in work_items:
+            start = int(work_item.date)
+            spans.setdefault(getattr(work_item, 'authorLogin', None), []).append(
+                (start, start + int(work_item.duration) * MINUTE_MS, work_item))
+        # sorted once here, rather than inserting each work item in order
+        for author, author_spans in spans.items():
+            author_spans.sort(key=lambda span: span[0])
+            self.starts[author] = [span[0] for span in author_spans]
+            self.ends[author] = [span[1] for span in author_spans]
+            self.items[author] = [span[2] for span in author_spans]
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+    def add(self, author, date, minutes, work_item=None):
+        """Index a span starting at date, in epoch milliseconds, lasting minutes"""
+
+        start = int(date)
+        starts = self.starts.setdefault(author, [])
+        i = bisect.bisect_right(starts, start)
+        starts.insert(i, start)
+        self.ends.setdefault(author, []).insert(i, start + int(minutes) * MINUTE_MS)
+        self.items.setdefault(author, []).insert(i, work_item)
+        # the running maximum is rebuilt on the next lookup
+        self.max_ends.pop(author, None)
+
+    def add_work_item(self, work_item, author=None):
+        self.add(author or getattr(work_item, 'authorLogin', None), work_item.date, work_item.duration, work_item)
+
+    def max_end(self, author):
+        max_ends = self.max_ends.get(author)
+        if max_ends is None:
+            max_ends = []
+            highest = None
+            for end in self.ends.get(author, []):
+                highest = end if highest is None else max(highest, end)
+                max_ends.append(highest)
+            self.max_ends[author] = max_ends
+        return max_ends
+
+    def overlapping(self, author, date, minutes):
+        """Return the earliest work item by author overlapping the span, or None
+
+        Spans only touching at one end don't overlap.
+        """
+
+        start = int(date)
+        end = start + int(minutes) * MINUTE_MS
+        # only work items starting before the span ends can overlap it
+        count = bisect.bisect_left(self.starts.get(author, []), end)
+        if not count:
+            return None
+        # the first of those ending after the span starts overlaps it
+        i = bisect.bisect_right(self.max_end(author), start, 0, count)
+        if i == count:
+            return None
+        return self.items[author][i]
+
+    def all_overlapping(self, author, date, minutes):
+        """Return all the work items by author overlapping the span, earliest first"""
+
+        start = int(date)
+        end = start + int(minutes) * MINUTE_MS
+        count = bisect.bisect_left(self.starts.get(author, []), end)
+        if not count:
+            return []
+        # none before the first overlapping work item overlap, later ones still need checking
+        i = bisect.bisect_right(self.max_end(author), start, 0, count)
+        ends = self.ends[author]
+        items = self.items[author]
+        return [items[j] for j in range(i, count) if ends[j] > start]
+
+    def overlapping_work_item(self, work_item, author):
+        return self.overlapping(author, work_item.date, work_item.duration)
+
+    def overlapping_work_items(self, work_item, author):
+        return self.all_overlapping(author, work_item.date, work_item.duration)
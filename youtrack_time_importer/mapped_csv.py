@@ -0,0 +1,136 @@
+import codecs
+import csv
+import mmap
+
+QUOTE = 0x22
+COMMA = 0x2C
+CR = 0x0D
+LF = 0x0A
+
+
+class MappedCSVReader(object):
+    """reads the rows of a CSV export straight from a memory map
+
+    Row and field boundaries are found in the map itself, and only the
+    columns asked for are copied out and decoded. Each row starts at a
+    byte offset, so reading can begin at any row, eg. to resume an import.
+
+    Quoted fields may contain commas, doubled quotes and line breaks.
+    """
+
+    def __init__(self, path, columns=None, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.fp = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            self.map = b""
+        self.size = len(self.map)
+
+        start = len(codecs.BOM_UTF8) if self.map[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+        spans, self.start = self.scan(start) if self.size else ([], 0)
+        self.fieldnames = [self.decode(span) for span in spans]
+
+        if columns is None:
+            columns = self.fieldnames
+        self.columns = [(name, self.fieldnames.index(name)) for name in columns if name in self.fieldnames]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for offset, data in self.rows():
+            yield data
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.fp.close()
+
+    def decode(self, span):
+        start, end, quoted = span
+        raw = self.map[start:end]
+        if quoted:
+            raw = raw.replace(b'""', b'"')
+        return raw.decode(self.encoding)
+
+    def scan(self, pos):
+        """Find the fields of the row starting at pos
+
+        Returns:
+            A tuple of the list of (start, end, quoted) spans of the
+            fields, and the offset of the next row
+        """
+
+        m = self.map
+        size = self.size
+        spans = []
+        line_end = -1
+        while True:
+            if pos < size and m[pos] == QUOTE:
+                j = pos + 1
+                while True:
+                    k = m.find(b'"', j)
+                    if k == -1:
+                        raise csv.Error("unexpected end of data in quoted field at byte {0}".format(pos))
+                    if k + 1 < size and m[k + 1] == QUOTE:
+                        j = k + 2
+                        continue
+                    break
+                spans.append((pos + 1, k, True))
+                pos = k + 1
+            else:
+                if line_end < pos:
+                    line_end = m.find(b'\n', pos)
+                    if line_end == -1:
+                        line_end = size
+                comma = m.find(b',', pos, line_end)
+                end = line_end if comma == -1 else comma
+                if end == line_end and end > pos and m[end - 1] == CR:
+                    end -= 1
+                spans.append((pos, end, False))
+                pos = end
+
+            if pos >= size:
+                return spans, size
+            if m[pos] == COMMA:
+                pos += 1
+                continue
+            if m[pos] == CR:
+                pos += 1
+            if pos < size and m[pos] == LF:
+                pos += 1
+            return spans, pos
+
+    def read_row(self, offset):
+        """Return the row at offset as a dict of the columns, and the next row's offset"""
+
+        spans, next_offset = self.scan(offset)
+        data = {}
+        for name, index in self.columns:
+            data[name] = self.decode(spans[index]) if index < len(spans) else None
+        return data, next_offset
+
+    def rows(self, start=None, end=None):
+        """Yield (offset, data) for each row starting between start and end
+
+        Args:
+            start: offset of the first row, defaults to the row after the header
+            end: offset to stop at, defaults to the end of the file
+        """
+
+        offset = self.start if start is None else max(start, self.start)
+        end = self.size if end is None else min(end, self.size)
+        while offset < end:
+            if self.map[offset] in (CR, LF):
+                # blank line
+                offset += 1
+                continue
+            data, next_offset = self.read_row(offset)
+            yield offset, data
+            offset = next_offset
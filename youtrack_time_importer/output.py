@@ -0,0 +1,141 @@
+import click
+import json
+import sys
+
+
+class Reporter(object):
+    """abstract reporter for the events produced while processing rows
+
+    A reporter receives one event per row (with the row object itself, not
+    a formatted string) and a summary at the end. Reporters only format a
+    row when they actually print it, so quiet and machine readable runs
+    never pay for building the human text.
+    """
+
+    statuses = ("ignored", "error", "duplicate", "created", "unresolved", "conflict", "updated")
+
+    #: whether the reporter may ask the user questions
+    interactive = False
+
+    def start(self, total):
+        pass
+
+    def entry(self, status, row, error=None):
+        pass
+
+    def fatal(self, row, error):
+        """Report the row that stopped the import, before the command fails"""
+
+    def summary(self, total, counts, cache=None):
+        """Report the counts per status, and the YouTrack cache stats if given"""
+
+    def close(self):
+        pass
+
+
+class HumanReporter(Reporter):
+    """reporter printing readable text to the terminal"""
+
+    interactive = True
+
+    labels = {
+        "ignored": "Ignored",
+        "error": "Error",
+        "duplicate": "Duplicate",
+        "created": "Created",
+        "unresolved": "Unresolved",
+        "conflict": "Conflict",
+        "updated": "Updated",
+    }
+
+    def start(self, total):
+        click.echo("\nProcessing {0} time entries. Please wait\n".format(total))
+
+    def entry(self, status, row, error=None):
+        if error:
+            click.echo("Could not upload Time Entry for {0}".format(row))
+            click.echo("  Error: {0}\n".format(error))
+        else:
+            click.echo("{0}: Time Entry for {1}\n".format(self.labels[status], row))
+
+    def fatal(self, row, error):
+        click.echo("Could not upload Time Entry for {0}".format(row))
+
+    def summary(self, total, counts, cache=None):
+        click.echo("Processed {0} time entries.".format(total))
+        for status in ("ignored", "error", "duplicate", "created"):
+            click.echo("  {0}: {1}.".format(self.labels[status], counts.get(status, 0)))
+        for status in ("unresolved", "conflict", "updated"):
+            if counts.get(status):
+                click.echo("  {0}: {1}.".format(self.labels[status], counts[status]))
+        if cache and cache['hits'] + cache['misses']:
+            click.echo("YouTrack cache: {hits} hits, {misses} misses, {evictions} evictions.".format(**cache))
+
+
+class QuietReporter(Reporter):
+    """reporter that prints nothing at all"""
+
+
+class JsonLinesReporter(Reporter):
+    """reporter writing one JSON object per event
+
+    Events are collected and written to the stream in blocks of
+    buffer_size lines, rather than one write per row.
+    """
+
+    def __init__(self, stream=None, buffer_size=512):
+        self.stream = stream if stream is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+    def write(self, event):
+        self.buffer.append(json.dumps(event, separators=(',', ':')))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write("\n".join(self.buffer) + "\n")
+            self.stream.flush()
+            self.buffer = []
+
+    def start(self, total):
+        self.write({"event": "start", "total": total})
+
+    def entry(self, status, row, error=None):
+        event = {"event": "entry", "status": status, "issue_id": row.issue_id or None}
+        work_item = row._work_item
+        if work_item is not None:
+            event["date"] = work_item.date
+            event["duration"] = work_item.duration
+            event["description"] = work_item.description
+        if error:
+            event["error"] = error
+        self.write(event)
+
+    def fatal(self, row, error):
+        self.entry("error", row, error)
+        self.flush()
+
+    def summary(self, total, counts, cache=None):
+        event = {"event": "summary", "total": total}
+        event.update((status, counts.get(status, 0)) for status in self.statuses)
+        if cache:
+            event["cache"] = cache
+        self.write(event)
+
+    def close(self):
+        self.flush()
+
+
+reporters = {
+    "human": HumanReporter,
+    "jsonl": JsonLinesReporter,
+    "quiet": QuietReporter,
+}
+
+
+def create_reporter(mode):
+    """Return a Reporter for the --output mode given"""
+
+    return reporters[mode]()
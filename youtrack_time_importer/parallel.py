@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+from youtrack_time_importer.mapped_csv import MappedCSVReader
+import os
+
+
+def split_ranges(path, parts, start=0):
+    """Split a file into at most parts byte ranges, each ending at a row break
+
+    Quoted fields may hold line breaks, eg. multi-line ManicTime notes, so
+    a range only ends at a line break outside quotes: one with an even
+    number of quotes before it, as doubled quotes inside a field count
+    twice. A range then always holds whole rows.
+
+    Args:
+        start: the offset of the first row, after the header
+    """
+
+    size = os.path.getsize(path)
+    step = max(1, (size - start) // max(1, parts))
+    ranges = []
+    quotes = 0
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        pos = start
+        while pos < size:
+            first = pos
+            chunk = fp.read(min(step, size - pos))
+            quotes += chunk.count(b'"')
+            pos += len(chunk)
+            while pos < size:
+                line = fp.readline()
+                quotes += line.count(b'"')
+                pos += len(line)
+                if quotes % 2 == 0:
+                    break
+            ranges.append((first, pos))
+    return ranges
+
+
+def parse_range(path, start, end, row_class, timezone=None):
+    """Parse the rows in a byte range of a CSV file into ParsedRecords
+
+    This runs in a worker process, so it takes everything it needs as
+    arguments and returns only plain data.
+    """
+
+    if timezone is not None:
+        row_class.timezone = timezone
+    with MappedCSVReader(path, row_class.csv_columns) as reader:
+        return [row_class(data, None, None).to_record() for offset, data in reader.rows(start, end)]
+
+
+def parse_file(path, row_class, jobs):
+    """Parse a CSV export across a pool of jobs processes
+
+    Returns:
+        A list of ParsedRecords, in the same order as the rows in the file
+    """
+
+    with MappedCSVReader(path) as reader:
+        ranges = split_ranges(path, jobs * 4, reader.start)
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(parse_range, path, start, end, row_class, row_class.timezone)
+                   for start, end in ranges]
+        return [record for future in futures for record in future.result()]
@@ -0,0 +1,285 @@
+from collections import OrderedDict
+from youtrack import WorkItem
+from youtrack import YouTrackException
+from youtrack_time_importer.aggregate import aggregate
+from youtrack_time_importer.fingerprint import FingerprintIndex
+from youtrack_time_importer.fingerprint import work_item_key
+from youtrack_time_importer.intervals import IntervalIndex
+from youtrack_time_importer.profiler import Profiler
+from youtrack_time_importer.row import fetch_work_items
+from youtrack_time_importer.row import Row
+import datetime
+import json
+
+
+class PlannedRow(Row):
+    """a row read back from an import plan
+
+    The plan already holds the issue id and the WorkItem properties, so
+    nothing needs parsing again. Only rows planned as "create" or
+    "conflict" are not ignored.
+    """
+
+    datetime_format = "%Y-%m-%dT%H:%M:%S%z"
+
+    def create_work_item(self):
+        work_item = WorkItem()
+        work_item.description = self.data.get('description')
+        work_item.duration = self.data.get('duration')
+        work_item.date = self.data.get('date')
+        return work_item
+
+    def is_ignored(self):
+        return self.data.get('status') not in (Plan.CREATE, Plan.CONFLICT)
+
+    def find_issue_id(self):
+        return self.data.get('issue_id') or False
+
+    def start_string(self):
+        start = datetime.datetime.fromtimestamp(int(self.data.get('date')) / 1000, datetime.timezone.utc)
+        return start.strftime(self.datetime_format)
+
+    def source_id(self):
+        return self.data.get('source_id')
+
+    def source_ids(self):
+        return self.data.get('source_ids', super().source_ids())
+
+    def fingerprint(self):
+        return self.data.get('fingerprint') or super().fingerprint()
+
+    def conflicting_work_item(self, work_items=None):
+        """Return the WorkItem this row was planned to update in place, or None"""
+        if work_items is not None:
+            return super().conflicting_work_item(work_items)
+        conflict = self.data.get('conflict')
+        if not conflict:
+            return None
+        return self.planned_work_item(conflict)
+
+    def conflicting_work_items(self, work_items=None):
+        """Return all the WorkItems found overlapping this row when planning"""
+        if work_items is not None:
+            return super().conflicting_work_items(work_items)
+        conflicts = self.data.get('conflicts')
+        if conflicts is None:
+            # plans saved before all the conflicts were recorded only have the first
+            conflicts = [self.data['conflict']] if self.data.get('conflict') else []
+        return [self.planned_work_item(conflict) for conflict in conflicts]
+
+    @staticmethod
+    def planned_work_item(properties):
+        work_item = WorkItem()
+        for name, value in properties.items():
+            setattr(work_item, name, value)
+        return work_item
+
+    def save_work_item(self):
+        super().save_work_item()
+        cls = type(self)
+        for source_id in self.source_ids():
+            cls.ids = source_id
+
+    def update_work_item(self, existing):
+        super().update_work_item(existing)
+        cls = type(self)
+        for source_id in self.source_ids():
+            cls.ids = source_id
+
+    def __str__(self):
+        return self.data.get('label', "")
+
+
+class Plan(object):
+    """the result of planning an import, which can be saved and applied later"""
+
+    VERSION = 1
+
+    CREATE = "create"
+    DUPLICATE = "duplicate"
+    IGNORED = "ignored"
+    UNRESOLVED = "unresolved"
+    CONFLICT = "conflict"
+
+    statuses = (CREATE, DUPLICATE, IGNORED, UNRESOLVED, CONFLICT)
+
+    def __init__(self, source, username, entries=None, created=None):
+        self.source = source
+        self.username = username
+        self.entries = entries if entries is not None else []
+        self.created = created or datetime.datetime.now().isoformat(timespec='seconds')
+
+    def add(self, status, row, conflict=None, conflicts=None):
+        """Add an entry for the row
+
+        Args:
+            conflict: the existing WorkItem a "conflict" row can update in
+            place, if any
+            conflicts: all the existing WorkItems a "conflict" row overlaps
+        """
+
+        entry = OrderedDict()
+        entry['status'] = status
+        entry['issue_id'] = row.issue_id or None
+        entry['label'] = str(row)
+        entry['source_id'] = row.source_id()
+        entry['source_ids'] = row.source_ids()
+        if status in (self.CREATE, self.DUPLICATE, self.CONFLICT):
+            entry['description'] = row.work_item.description
+            entry['duration'] = row.work_item.duration
+            entry['date'] = row.work_item.date
+            entry['fingerprint'] = row.fingerprint()
+        if conflict is not None:
+            entry['conflict'] = self.work_item_entry(conflict)
+        if conflicts:
+            entry['conflicts'] = [self.work_item_entry(work_item) for work_item in conflicts]
+        self.entries.append(entry)
+        return entry
+
+    @staticmethod
+    def work_item_entry(work_item):
+        return OrderedDict((name, getattr(work_item, name, None))
+                           for name in ('url', 'id', 'date', 'duration', 'description'))
+
+    def counts(self):
+        counts = dict.fromkeys(self.statuses, 0)
+        for entry in self.entries:
+            counts[entry['status']] += 1
+        return counts
+
+    def save(self, fp):
+        json.dump(OrderedDict([
+            ('version', self.VERSION),
+            ('source', self.source),
+            ('username', self.username),
+            ('created', self.created),
+            ('entries', self.entries),
+        ]), fp, indent=2)
+
+    @classmethod
+    def load(cls, fp):
+        data = json.load(fp)
+        if data.get('version') != cls.VERSION:
+            raise ValueError("Unsupported plan version: {0}".format(data.get('version')))
+        return cls(data['source'], data['username'], data['entries'], data['created'])
+
+
+class Planner(object):
+    """works out what an import would do without writing to YouTrack
+
+    Existing work items are fetched once per distinct issue before any
+    row is compared, instead of once per row, and kept as a
+    FingerprintIndex per issue to find duplicates and an IntervalIndex to
+    find the work items a row overlaps.
+
+    A row may only update the work item it overlaps in place if that is
+    the only one it overlaps, and no other row in the import has already
+    updated or created it. The keys of those work items are kept in
+    claimed, which isn't dropped by forget.
+    """
+
+    def __init__(self, connection, username, profiler=None, tolerance=0):
+        self.connection = connection
+        self.username = username
+        self.profiler = profiler or Profiler()
+        self.tolerance = tolerance
+        self.work_items = dict()
+        self.intervals = dict()
+        self.claimed = set()
+
+    def prefetch(self, issue_ids):
+        """Fetch the work items for each issue not already fetched
+
+        Issues which can't be fetched are stored as None, the rest as a
+        FingerprintIndex, with an IntervalIndex of them in intervals.
+        """
+
+        for issue_id in issue_ids:
+            if issue_id in self.work_items:
+                continue
+            try:
+                with self.profiler.stage('prefetch'):
+                    work_items = fetch_work_items(self.connection, issue_id)
+            except YouTrackException as e:
+                self.work_items[issue_id] = None
+            else:
+                self.work_items[issue_id] = FingerprintIndex(work_items)
+                self.intervals[issue_id] = IntervalIndex(work_items)
+
+    def forget(self, issue_id):
+        """Drop the work items fetched for an issue, eg. once one has been changed, so they are fetched again"""
+        self.work_items.pop(issue_id, None)
+        self.intervals.pop(issue_id, None)
+
+    def conflicts(self, row):
+        """Return the existing work items overlapping the row, earliest first
+
+        Only work items already in YouTrack are indexed, not the rows
+        planned for creation in this import.
+        """
+        return row.conflicting_work_items(self.intervals[row.issue_id])
+
+    def update_target(self, row, conflicts):
+        """Return the work item the row can update in place, or None
+
+        Updating one of several work items would leave the time of the
+        others booked twice, and updating one another row has claimed would
+        overwrite that row's time.
+        """
+
+        if len(conflicts) != 1:
+            return None
+        conflict = conflicts[0]
+        if work_item_key(row.username, conflict.date, conflict.duration) in self.claimed:
+            return None
+        return conflict
+
+    def claim(self, row, conflict=None):
+        """Mark the row's work item, and the one it updates if any, as written by this import"""
+        self.claimed.add(row.work_item_key())
+        if conflict is not None:
+            self.claimed.add(work_item_key(row.username, conflict.date, conflict.duration))
+
+    def plan(self, rows, row_class, source=None, rounding=None):
+        """Return a Plan for the raw rows given
+
+        Args:
+            rows: the raw rows, as dicts, from the CSV file or API
+            row_class: the Row subclass used to read them
+            source: name of the source saved in the plan, defaults to
+            the name of the row class
+            rounding: if given, rows are aggregated per issue, day and
+            author, with durations rounded to this many minutes
+        """
+
+        plan = Plan(source or row_class.__name__, self.username)
+        rows = [row_class.create(row, self.connection, self.username) for row in rows]
+        if rounding:
+            rows = aggregate(rows, self.connection, self.username, rounding)
+        ignored = [row.is_ignored() for row in rows]
+
+        self.prefetch(OrderedDict.fromkeys(
+            row.issue_id for row, is_ignored in zip(rows, ignored) if not is_ignored and row.issue_id))
+
+        for row, is_ignored in zip(rows, ignored):
+            if is_ignored:
+                plan.add(Plan.IGNORED, row)
+                continue
+            work_items = self.work_items.get(row.issue_id) if row.issue_id else None
+            if work_items is None:
+                plan.add(Plan.UNRESOLVED, row)
+            elif row.is_duplicate_of(work_items, self.tolerance):
+                plan.add(Plan.DUPLICATE, row)
+            else:
+                conflicts = self.conflicts(row)
+                if conflicts:
+                    conflict = self.update_target(row, conflicts)
+                    plan.add(Plan.CONFLICT, row, conflict, conflicts)
+                    if conflict is not None:
+                        self.claim(row, conflict)
+                    continue
+                plan.add(Plan.CREATE, row)
+                self.claim(row)
+                # a repeated entry in the same import is then a duplicate, not created twice
+                work_items.add_work_item(row.work_item, self.username)
+        return plan
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import bisect
+import json
+import time
+
+
+class LatencyHistogram(object):
+    """Fixed bucket histogram of latencies measured in seconds
+
+    Buckets are upper bounds in milliseconds. Anything slower than the
+    last bucket is counted in the overflow bucket, shown as "inf".
+    """
+
+    buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        labels = [str(b) for b in self.buckets] + ["inf"]
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'mean_ms': round(self.mean() * 1000, 3),
+            'min_ms': round((self.min or 0) * 1000, 3),
+            'max_ms': round((self.max or 0) * 1000, 3),
+            'buckets_ms': OrderedDict(zip(labels, self.counts)),
+        }
+
+
+class Profiler(object):
+    """records time spent in each stage of an import and requests per host
+
+    Stages are named blocks of work (login, fetch, parse, work_item_exists,
+    save_work_item, tag_update). Requests are individual HTTP calls, keyed
+    by the host they were sent to, so a slow run can be pinned on Toggl,
+    YouTrack or our own parsing.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.hosts = OrderedDict()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    @contextmanager
+    def request(self, url):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_request(url, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        self.stages.setdefault(name, LatencyHistogram()).add(seconds)
+
+    def add_request(self, url, seconds):
+        host = urlparse(url).netloc or url
+        self.hosts.setdefault(host, LatencyHistogram()).add(seconds)
+
+    def instrument_http(self, connection):
+        """Wrap the httplib2 client of a YouTrack Connection
+
+        Every request made by the connection, including the login and any
+        re-login, is then timed and counted against its host.
+        """
+
+        http = getattr(connection, 'http', None)
+        if http is None or getattr(http.request, 'profiled', False) is True:
+            return connection
+        original = http.request
+
+        def request(uri, *args, **kwargs):
+            with self.request(uri):
+                return original(uri, *args, **kwargs)
+
+        request.profiled = True
+        http.request = request
+        return connection
+
+    def as_dict(self):
+        return {
+            'elapsed_s': round(time.perf_counter() - self.started, 6),
+            'stages': OrderedDict((k, v.as_dict()) for k, v in self.stages.items()),
+            'hosts': OrderedDict((k, v.as_dict()) for k, v in self.hosts.items()),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def report(self):
+        """Return a human readable summary of stages and requests"""
+
+        lines = ["Profile ({0:.3f}s elapsed)".format(time.perf_counter() - self.started)]
+        for title, group in (("Stages", self.stages), ("Requests", self.hosts)):
+            if not group:
+                continue
+            lines.append("  {0}:".format(title))
+            for name, histogram in group.items():
+                lines.append("    {0:<18} {1:>6} calls {2:>10.3f}s total {3:>9.1f}ms mean {4:>9.1f}ms max".format(
+                    name, histogram.count, histogram.total, histogram.mean() * 1000, (histogram.max or 0) * 1000))
+                buckets = ["<={0}ms: {1}".format(b, c) for b, c in zip(histogram.buckets, histogram.counts) if c]
+                if histogram.counts[-1]:
+                    buckets.append(">{0}ms: {1}".format(histogram.buckets[-1], histogram.counts[-1]))
+                lines.append("      " + ", ".join(buckets))
+        return "\n".join(lines)
@@ -0,0 +1,101 @@
+from collections import namedtuple
+import csv
+import datetime
+
+Difference = namedtuple('Difference', ['status', 'issue_id', 'date', 'source_minutes', 'youtrack_minutes',
+                                       'description'])
+
+MISSING_IN_YOUTRACK = "missing_in_youtrack"
+MISSING_IN_SOURCE = "missing_in_source"
+CHANGED = "changed"
+
+
+def source_entries(rows, since, until):
+    """Return (issue_id, date, minutes, description) for the source rows in the date range
+
+    Ignored rows are left out. Rows without an issue id are kept, as they
+    can never be in YouTrack.
+
+    Args:
+        rows: Row objects
+        since: start of the range, in epoch milliseconds (inclusive)
+        until: end of the range, in epoch milliseconds (exclusive)
+    """
+
+    entries = []
+    for row in rows:
+        if row.is_ignored():
+            continue
+        work_item = row.work_item
+        date = int(work_item.date)
+        if since <= date < until:
+            entries.append((row.issue_id or None, date, int(work_item.duration), work_item.description))
+    return entries
+
+
+def reconcile(entries, work_items, author, tolerance=0):
+    """Return the Differences between source entries and YouTrack work items
+
+    Both sides are joined on key tuples in a dict, so this takes time
+    linear in the number of entries and work items. An entry matches a
+    work item on the same issue with the same start and duration. Failing
+    that, a work item on the same issue with the same start is reported as
+    changed, unless its duration is
+    within tolerance minutes of the entry's. Whatever is left on either
+    side is missing from the other.
+
+    Args:
+        entries: (issue_id, date, minutes, description) from the source,
+        as returned by source_entries
+        work_items: (issue_id, author, date, duration, description) from
+        YouTrack, as returned by WorkItemStore.work_items
+        author: the login the source entries were logged by
+    """
+
+    work_items = [work_item for work_item in work_items if work_item[1] == author]
+    exact = dict()
+    starts = dict()
+    for index, (issue_id, work_item_author, date, duration, description) in enumerate(work_items):
+        exact.setdefault((issue_id, int(date), int(duration)), []).append(index)
+        starts.setdefault((issue_id, int(date)), []).append(index)
+    matched = [False] * len(work_items)
+
+    def take(indexes):
+        while indexes:
+            index = indexes.pop()
+            if not matched[index]:
+                matched[index] = True
+                return index
+        return None
+
+    differences = []
+    unmatched = []
+    for entry in entries:
+        if take(exact.get((entry[0], int(entry[1]), int(entry[2])), [])) is None:
+            unmatched.append(entry)
+
+    for issue_id, date, minutes, description in unmatched:
+        index = take(starts.get((issue_id, int(date)), []))
+        if index is None:
+            differences.append(Difference(MISSING_IN_YOUTRACK, issue_id, date, minutes, None, description))
+            continue
+        work_item = work_items[index]
+        if abs(work_item[3] - minutes) > tolerance:
+            differences.append(Difference(CHANGED, work_item[0], date, minutes, work_item[3], description))
+
+    for index, (issue_id, work_item_author, date, duration, description) in enumerate(work_items):
+        if not matched[index]:
+            differences.append(Difference(MISSING_IN_SOURCE, issue_id, date, None, duration, description))
+
+    differences.sort(key=lambda difference: difference.date)
+    return differences
+
+
+def write_differences(differences, fp):
+    """Write the Differences as CSV, with dates in ISO 8601"""
+
+    writer = csv.writer(fp)
+    writer.writerow(Difference._fields)
+    for difference in differences:
+        date = datetime.datetime.fromtimestamp(difference.date / 1000, datetime.timezone.utc).astimezone()
+        writer.writerow(difference._replace(date=date.isoformat(timespec='seconds')))
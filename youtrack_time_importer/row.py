@@ -1,8 +1,23 @@
 from youtrack import WorkItem
 from youtrack import YouTrackException
+from youtrack_time_importer.fingerprint import fingerprint
+from youtrack_time_importer.fingerprint import FingerprintIndex
+from youtrack_time_importer.fingerprint import work_item_key
+from youtrack_time_importer.intervals import IntervalIndex
+from youtrack_time_importer.timestamps import epoch_ms
+from youtrack_time_importer.timestamps import parse_datetime
+from collections import namedtuple
+from xml.dom import minidom
+from xml.dom import Node
+from xml.sax.saxutils import escape
 import abc
-import datetime
 import re
+import urllib.parse
+
+
+# a row already parsed, possibly in another process. The WorkItem
+# properties are None for ignored rows, as those are never uploaded.
+ParsedRecord = namedtuple('ParsedRecord', ['data', 'issue_id', 'ignored', 'description', 'duration', 'date'])
 
 
 class MetaRow(abc.ABCMeta):
@@ -18,6 +33,12 @@ class MetaRow(abc.ABCMeta):
 class Row(metaclass=MetaRow):
     """abstract class to handle a row of data from a CSV or API call"""
 
+    #: the CSV columns the row reads, None for all of them
+    csv_columns = None
+
+    #: tzinfo used for start times without a UTC offset, None for the host's timezone
+    timezone = None
+
     issue_finder = re.compile('^(?P<issue_id>[a-zA-Z0-9_]+\-[0-9]+)', flags=re.IGNORECASE)
 
     @abc.abstractproperty
@@ -70,12 +91,59 @@ class Row(metaclass=MetaRow):
     def __str__(self):
         pass
 
+    @abc.abstractmethod
+    def start_string(self):
+        """Return the start date and time as found in the row's data
+
+        Returns:
+            A string in the row's datetime_format
+        """
+
+    def start_datetime(self):
+        """Return a timezone aware datetime object of the start date and time"""
+        return parse_datetime(self.start_string(), self.datetime_format, self.timezone)
+
+    def start_timestamp(self):
+        """Return the start date and time as a Unix Timestamp in milliseconds"""
+        return epoch_ms(self.start_string(), self.datetime_format, self.timezone)
+
     def __init__(self, data, connection, username):
         self.data = data
         self.connection = connection
         self.username = username
         self._issue_id = None
         self._work_item = None
+        self._fingerprint = None
+        self._key = None
+
+    @classmethod
+    def create(cls, data, connection, username):
+        """Return a Row for data, which may be raw data, a ParsedRecord or a Row"""
+        if isinstance(data, Row):
+            return data
+        if isinstance(data, ParsedRecord):
+            return cls.from_record(data, connection, username)
+        return cls(data, connection, username)
+
+    @classmethod
+    def from_record(cls, record, connection, username):
+        """Return a Row with the issue id and WorkItem taken from a ParsedRecord"""
+        row = cls(record.data, connection, username)
+        row._issue_id = record.issue_id
+        if not record.ignored:
+            work_item = WorkItem()
+            work_item.description = record.description
+            work_item.duration = record.duration
+            work_item.date = record.date
+            row._work_item = work_item
+        return row
+
+    def to_record(self):
+        """Return this row as a ParsedRecord, parsing everything needed to upload it"""
+        if self.is_ignored():
+            return ParsedRecord(self.data, self.issue_id, True, None, None, None)
+        work_item = self.work_item
+        return ParsedRecord(self.data, self.issue_id, False, work_item.description, work_item.duration, work_item.date)
 
     @property
     def issue_id(self):
@@ -97,13 +165,29 @@ class Row(metaclass=MetaRow):
     def work_item(self, value):
         self._work_item = value
 
-    def work_item_exists(self):
+    def work_item_key(self):
+        """Return the key this row's WorkItem is looked up by when finding duplicates"""
+        if self._key is None:
+            self._key = work_item_key(self.username, self.work_item.date, self.work_item.duration)
+        return self._key
+
+    def fingerprint(self):
+        """Return the fingerprint of this row's WorkItem and source id, as saved in plans"""
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.username, self.work_item.date, self.work_item.duration,
+                                            self.source_id())
+        return self._fingerprint
+
+    def work_item_exists(self, tolerance=0):
         """Checks to see if WorkItem already exists
 
         Gets all the WorkItems for an issue and checks to see if
         once exists with the same date and duration. As date is a timestamp
         based on date and time, this should be completely unique.
 
+        Args:
+            tolerance: the number of minutes the duration may differ by
+
         Returns:
             Boolean value, returning True if it exists, and false if :
             it doesn't
@@ -113,19 +197,100 @@ class Row(metaclass=MetaRow):
         """
 
         try:
-            work_items = self.connection.getWorkItems(self.issue_id)
+            work_items = fetch_work_items(self.connection, self.issue_id)
         except YouTrackException as e:
             return False
         except TypeError as e:
             # no issue id
             return False
         else:
-            for work_item in work_items:
-                if (work_item.authorLogin == self.username and
-                        work_item.date == self.work_item.date and
-                        work_item.duration == self.work_item.duration):
-                    return True
-            return False
+            return self.is_duplicate_of(work_items, tolerance)
+
+    def is_duplicate_of(self, work_items, tolerance=0):
+        """Checks the given WorkItems for one matching this row
+
+        Args:
+            work_items: a list of WorkItems or a FingerprintIndex of them
+            tolerance: the number of minutes the duration may differ by
+
+        Returns:
+            Boolean value, returning True if one of the WorkItems has the
+            same author, date and duration as this row's WorkItem
+        """
+
+        if not isinstance(work_items, FingerprintIndex):
+            work_items = FingerprintIndex(work_items)
+        return work_items.contains_key(self.work_item_key(), tolerance)
+
+    def conflicting_work_item(self, work_items=None):
+        """Return an existing WorkItem whose time overlaps this row's, or None
+
+        An entry edited in its source after it was uploaded, eg. made 5
+        minutes longer, is no longer a duplicate but overlaps the work item
+        uploaded before. Uploading it again would book the time twice.
+
+        Args:
+            work_items: a list of WorkItems or an IntervalIndex of them,
+            fetched from the row's issue if not given
+        """
+
+        if work_items is None:
+            try:
+                work_items = fetch_work_items(self.connection, self.issue_id)
+            except (YouTrackException, TypeError) as e:
+                return None
+        if not isinstance(work_items, IntervalIndex):
+            work_items = IntervalIndex(work_items)
+        return work_items.overlapping_work_item(self.work_item, self.username)
+
+    def conflicting_work_items(self, work_items=None):
+        """Return all the existing WorkItems whose time overlaps this row's, earliest first
+
+        Args:
+            work_items: a list of WorkItems or an IntervalIndex of them,
+            fetched from the row's issue if not given
+        """
+
+        if work_items is None:
+            try:
+                work_items = fetch_work_items(self.connection, self.issue_id)
+            except (YouTrackException, TypeError) as e:
+                return []
+        if not isinstance(work_items, IntervalIndex):
+            work_items = IntervalIndex(work_items)
+        return work_items.overlapping_work_items(self.work_item, self.username)
+
+    def update_work_item(self, existing):
+        """Replaces an existing WorkItem in Youtrack with this row's WorkItem
+
+        Args:
+            existing: the WorkItem to update, as fetched from YouTrack so
+            that it has its url
+
+        Raises:
+            a YoutrackIssueNotFoundException if the WorkItem can't be updated
+        """
+
+        url = getattr(existing, 'url', None) or '/issue/{0}/timetracking/workitem/{1}'.format(
+            urllib.parse.quote(self.issue_id), existing.id)
+        work_item = self.work_item
+        xml = '<workItem><date>{0}</date><duration>{1}</duration>'.format(work_item.date, work_item.duration)
+        if work_item.description is not None:
+            xml += '<description>{0}</description>'.format(escape(work_item.description))
+        xml += '</workItem>'
+        try:
+            self.connection._req('PUT', url, xml.encode('utf-8'))
+        except YouTrackException as e:
+            raise YoutrackIssueNotFoundException
+
+    def source_id(self):
+        """Return the id of this entry in the source it came from, if any"""
+        return None
+
+    def source_ids(self):
+        """Return the ids of all the source entries making up this row"""
+        source_id = self.source_id()
+        return [] if source_id is None else [source_id]
 
     def save_work_item(self):
         """Saves WorkItem to Youtrack
@@ -161,13 +326,14 @@ class Row(metaclass=MetaRow):
 
 class ManictimeRow(Row):
     datetime_format = "%Y-%m-%d %H:%M:%S"
+    csv_columns = ('Notes', 'Description', 'Duration', 'Start date', 'Start time')
 
     def create_work_item(self):
         work_item = WorkItem()
 
         description = self.data.get('Notes', self.data.get('Description', ""))
         duration = self.duration_as_minutes()
-        date = round(self.start_datetime().timestamp()*1000)
+        date = self.start_timestamp()
 
         work_item.description = description
         work_item.duration = str(duration)
@@ -179,12 +345,14 @@ class ManictimeRow(Row):
         duration = self.data.get('Duration').split(":")
         return int(duration[0])*60 + int(duration[1]) + round(float(duration[2])/60)
 
-    def start_datetime(self):
-        """Return a datetime object representation of the start date and time"""
+    def duration_as_seconds(self):
+        duration = self.data.get('Duration').split(":")
+        return int(duration[0])*3600 + int(duration[1])*60 + float(duration[2])
+
+    def start_string(self):
         date_string = self.data.get('Start date')
         time_string = self.data.get('Start time')
-        start_datetime_string = "{date} {time}".format(date=date_string, time=time_string)
-        return datetime.datetime.strptime(start_datetime_string, self.datetime_format)
+        return "{date} {time}".format(date=date_string, time=time_string)
 
     def __str__(self):
         description = self.data.get("Description")
@@ -205,13 +373,14 @@ class ManictimeRow(Row):
 
 class TogglCSVRow(Row):
     datetime_format = "%Y-%m-%d %H:%M:%S"
+    csv_columns = ('Description', 'Duration', 'Start date', 'Start time')
 
     def create_work_item(self):
         work_item = WorkItem()
 
         description = self.data.get('Description')
         duration = self.duration_as_minutes()
-        date = round(self.start_datetime().timestamp()*1000)
+        date = self.start_timestamp()
 
         work_item.description = description
         work_item.duration = str(duration)
@@ -223,11 +392,12 @@ class TogglCSVRow(Row):
         duration = self.data.get('Duration').split(":")
         return int(duration[0])*60 + int(duration[1]) + round(float(duration[2])/60)
 
-    def start_datetime(self):
-        """Return a datetime object representation of the start date and time"""
+    def duration_as_seconds(self):
+        duration = self.data.get('Duration').split(":")
+        return int(duration[0])*3600 + int(duration[1])*60 + float(duration[2])
 
-        start = "{0} {1}".format(self.data.get('Start date'), self.data.get('Start time'))
-        return datetime.datetime.strptime(start, self.datetime_format)
+    def start_string(self):
+        return "{0} {1}".format(self.data.get('Start date'), self.data.get('Start time'))
 
     def __str__(self):
         description = self.data.get("Description")
@@ -247,14 +417,14 @@ class TogglCSVRow(Row):
 
 
 class TogglAPIRow(Row):
-    datetime_format = "%Y-%m-%dT%H:%M:%S"
+    datetime_format = "%Y-%m-%dT%H:%M:%S%z"
 
     def create_work_item(self):
         work_item = WorkItem()
 
         description = self.data.get("description")
         duration = round(self.data.get("dur")/1000/60)
-        date = round(self.start_datetime().timestamp()*1000)
+        date = self.start_timestamp()
 
         work_item.description = description
         work_item.duration = str(duration)
@@ -262,6 +432,9 @@ class TogglAPIRow(Row):
 
         return work_item
 
+    def duration_as_seconds(self):
+        return self.data.get("dur")/1000
+
     def __str__(self):
         description = self.data.get("description")
         time = self.start_datetime().strftime("%H:%M")
@@ -278,16 +451,36 @@ class TogglAPIRow(Row):
         except AttributeError as e:
             return False
 
-    def start_datetime(self):
-        """Return a datetime object representation of the start date and time"""
+    def start_string(self):
+        return self.data.get('start')
 
-        start = self.data.get('start').split("+")[0]
-        return datetime.datetime.strptime(start, self.datetime_format)
+    def source_id(self):
+        return self.data.get('id')
 
     def save_work_item(self):
         super().save_work_item()
         cls = type(self)
-        cls.ids = self.data.get('id')
+        cls.ids = self.source_id()
+
+    def update_work_item(self, existing):
+        super().update_work_item(existing)
+        cls = type(self)
+        cls.ids = self.source_id()
+
+
+def fetch_work_items(connection, issue_id):
+    """Return all the WorkItems of an issue in one request
+
+    Unlike Connection.getWorkItems this lets the YouTrackException through,
+    so that an issue that doesn't exist can be told apart from an issue
+    without any work items.
+    """
+
+    url = '/issue/%s/timetracking/workitem' % urllib.parse.quote(issue_id)
+    response, content = connection._req('GET', url, content_type="application/xml")
+    xml = minidom.parseString(content)
+    return [WorkItem(e, connection) for e in xml.documentElement.childNodes
+            if e.nodeType == Node.ELEMENT_NODE]
 
 
 class YoutrackIssueNotFoundException(Exception):
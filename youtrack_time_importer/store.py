@@ -0,0 +1,165 @@
+from youtrack import YouTrackException
+from youtrack_time_importer.profiler import Profiler
+from youtrack_time_importer.row import fetch_work_items
+import datetime
+import sqlite3
+import time
+
+
+class WorkItemStore(object):
+    """local index of the work items pulled from YouTrack
+
+    Work items are kept in SQLite, indexed by date, issue and author, so
+    reports over long date ranges are answered locally. The store is
+    refreshed one issue at a time: all of an issue's work items are
+    replaced whenever that issue is fetched again.
+    """
+
+    groupings = {
+        "issue": "issue_id",
+        "project": "project",
+        "user": "author",
+    }
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS work_items (
+            issue_id TEXT NOT NULL,
+            project TEXT NOT NULL,
+            author TEXT,
+            date INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            description TEXT,
+            url TEXT
+        );
+        CREATE INDEX IF NOT EXISTS work_items_date ON work_items (date);
+        CREATE INDEX IF NOT EXISTS work_items_issue ON work_items (issue_id);
+        CREATE INDEX IF NOT EXISTS work_items_author_date ON work_items (author, date);
+        CREATE TABLE IF NOT EXISTS issues (
+            issue_id TEXT PRIMARY KEY,
+            refreshed INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(self.schema)
+
+    def close(self):
+        self.db.close()
+
+    def replace_work_items(self, issue_id, work_items):
+        """Replace everything stored for the issue with the work items given"""
+
+        project = issue_id.split("-")[0]
+        rows = [(issue_id, project, getattr(work_item, 'authorLogin', None), int(work_item.date),
+                 int(work_item.duration), getattr(work_item, 'description', None), getattr(work_item, 'url', None))
+                for work_item in work_items]
+        with self.db:
+            self.db.execute("DELETE FROM work_items WHERE issue_id = ?", (issue_id,))
+            self.db.executemany("INSERT INTO work_items VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO issues VALUES (?, ?)", (issue_id, int(time.time())))
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def last_refresh(self):
+        """Return the date of the last refresh, or None if never refreshed"""
+
+        value = self.get_meta('last_refresh')
+        return datetime.date.fromisoformat(value) if value else None
+
+    def work_items(self, since, until, author=None):
+        """Return (issue_id, author, date, duration, description) for the date range
+
+        Args:
+            since: start of the range, in epoch milliseconds (inclusive)
+            until: end of the range, in epoch milliseconds (exclusive)
+            author: if given, only work items by this login are returned
+        """
+
+        sql = "SELECT issue_id, author, date, duration, description FROM work_items WHERE date >= ? AND date < ?"
+        params = [since, until]
+        if author:
+            sql += " AND author = ?"
+            params.append(author)
+        return self.db.execute(sql + " ORDER BY date", params).fetchall()
+
+    def report(self, grouping, since, until, author=None):
+        """Return (name, minutes, work item count) for each group in the date range
+
+        Args:
+            grouping: one of "issue", "project" or "user"
+            since: start of the range, in epoch milliseconds (inclusive)
+            until: end of the range, in epoch milliseconds (exclusive)
+            author: if given, only work items by this login are counted
+        """
+
+        column = self.groupings[grouping]
+        sql = ("SELECT {0}, SUM(duration), COUNT(*) FROM work_items "
+               "WHERE date >= ? AND date < ?").format(column)
+        params = [since, until]
+        if author:
+            sql += " AND author = ?"
+            params.append(author)
+        sql += " GROUP BY {0} ORDER BY SUM(duration) DESC, {0}".format(column)
+        return self.db.execute(sql, params).fetchall()
+
+
+def refresh(store, connection, since, query="updated: {since} .. Today", page_size=100, profiler=None):
+    """Fetch the work items of every issue updated since the date given
+
+    Only the issues matching the query are fetched again, so after the
+    first refresh only recently updated issues cost a request.
+
+    Args:
+        store: the WorkItemStore to update
+        since: a date; if the store already covers it, the refresh
+        starts from the last refresh instead
+        query: the YouTrack search for issues to refresh, {since} is
+        replaced by the start date
+
+    Returns:
+        The number of issues refreshed
+    """
+
+    profiler = profiler or Profiler()
+    today = datetime.date.today()
+    covered = store.get_meta('covered_since')
+    covered = datetime.date.fromisoformat(covered) if covered else None
+    if covered is None or since < covered:
+        start = since
+        covered = since
+    else:
+        start = store.last_refresh() or since
+    search = query.format(since=start.strftime("%Y-%m-%d"))
+
+    refreshed = 0
+    after = 0
+    while True:
+        with profiler.stage('fetch_issues'):
+            issues = connection.getAllIssues(search, after, page_size)
+        for issue in issues:
+            try:
+                with profiler.stage('fetch_work_items'):
+                    work_items = fetch_work_items(connection, issue.id)
+            except YouTrackException as e:
+                continue
+            store.replace_work_items(issue.id, work_items)
+            refreshed += 1
+        if len(issues) < page_size:
+            break
+        after += page_size
+
+    store.set_meta('last_refresh', today.isoformat())
+    store.set_meta('covered_since', covered.isoformat())
+    return refreshed
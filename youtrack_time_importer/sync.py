@@ -0,0 +1,396 @@
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from youtrack_time_importer.mapped_csv import MappedCSVReader
+from youtrack_time_importer.plan import Plan
+from youtrack_time_importer.plan import PlannedRow
+from youtrack_time_importer.plan import Planner
+from youtrack_time_importer.profiler import Profiler
+from youtrack_time_importer.row import ManictimeRow
+from youtrack_time_importer.row import TogglAPIRow
+from youtrack_time_importer.row import TogglCSVRow
+from youtrack_time_importer.row import YoutrackIssueNotFoundException
+from youtrack_time_importer import toggl
+import datetime
+import json
+import requests
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+Job = namedtuple('Job', ['id', 'source', 'attempts'])
+
+
+class JobQueue(object):
+    """persistent queue of sync jobs, one per run of a source
+
+    Jobs live in SQLite in the app dir, so they survive restarts, and a
+    source never has more than one job queued or running at a time.
+    Entries a job couldn't resolve, or that overlap a work item already in
+    YouTrack, are kept for a person to review.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            scheduled REAL NOT NULL,
+            started REAL,
+            finished REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_scheduled ON jobs (status, scheduled);
+        CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source, scheduled);
+        CREATE TABLE IF NOT EXISTS unresolved (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'unresolved',
+            issue_id TEXT,
+            label TEXT,
+            entry TEXT NOT NULL,
+            recorded REAL NOT NULL,
+            UNIQUE (source, key)
+        );
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(self.schema)
+        # queues created before conflicts were recorded have no status column
+        if 'status' not in [row[1] for row in self.db.execute("PRAGMA table_info(unresolved)")]:
+            with self.db:
+                self.db.execute("ALTER TABLE unresolved ADD COLUMN status TEXT NOT NULL DEFAULT 'unresolved'")
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def execute(self, sql, params=()):
+        with self.lock, self.db:
+            return self.db.execute(sql, params).fetchall()
+
+    def recover(self):
+        """Queue again any job left running when the service last stopped"""
+
+        self.execute("UPDATE jobs SET status = ? WHERE status = ?", (self.QUEUED, self.RUNNING))
+
+    def enqueue(self, source, when=None):
+        """Queue a job for source, unless one is already queued or running
+
+        Returns:
+            The id of the new job, or None
+        """
+
+        when = time.time() if when is None else when
+        with self.lock, self.db:
+            pending = self.db.execute("SELECT 1 FROM jobs WHERE source = ? AND status IN (?, ?)",
+                                      (source, self.QUEUED, self.RUNNING)).fetchone()
+            if pending:
+                return None
+            return self.db.execute("INSERT INTO jobs (source, status, scheduled) VALUES (?, ?, ?)",
+                                   (source, self.QUEUED, when)).lastrowid
+
+    def claim(self, now=None):
+        """Mark the next due job as running and return it, or None if no job is due"""
+
+        now = time.time() if now is None else now
+        with self.lock, self.db:
+            row = self.db.execute("SELECT id, source, attempts FROM jobs WHERE status = ? AND scheduled <= ? "
+                                  "ORDER BY scheduled LIMIT 1", (self.QUEUED, now)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE id = ?",
+                            (self.RUNNING, now, row[0]))
+            return Job(row[0], row[1], row[2] + 1)
+
+    def finish(self, job, result):
+        self.execute("UPDATE jobs SET status = ?, finished = ?, result = ? WHERE id = ?",
+                     (self.DONE, time.time(), json.dumps(result), job.id))
+
+    def fail(self, job, error, retry_delay=300, max_attempts=3):
+        """Record a failed job, queueing it again after retry_delay seconds until max_attempts"""
+
+        if job.attempts < max_attempts:
+            self.execute("UPDATE jobs SET status = ?, scheduled = ?, result = ? WHERE id = ?",
+                         (self.QUEUED, time.time() + retry_delay * job.attempts, str(error), job.id))
+        else:
+            self.execute("UPDATE jobs SET status = ?, finished = ?, result = ? WHERE id = ?",
+                         (self.FAILED, time.time(), str(error), job.id))
+
+    def has_due(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.execute("SELECT 1 FROM jobs WHERE status = ? AND scheduled <= ? LIMIT 1",
+                                 (self.QUEUED, now)))
+
+    def last_scheduled(self, source):
+        row = self.execute("SELECT MAX(scheduled) FROM jobs WHERE source = ?", (source,))
+        return row[0][0]
+
+    def last_success(self, source):
+        row = self.execute("SELECT MAX(started) FROM jobs WHERE source = ? AND status = ?", (source, self.DONE))
+        return row[0][0]
+
+    def record_unresolved(self, source, entry):
+        """Record a planned entry for review under its status, eg. unresolved or conflict"""
+
+        key = json.dumps([entry.get('label'), entry.get('date'), entry.get('source_ids')])
+        self.execute("INSERT OR IGNORE INTO unresolved (source, key, status, issue_id, label, entry, recorded) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (source, key, entry.get('status', Plan.UNRESOLVED), entry.get('issue_id'), entry.get('label'),
+                      json.dumps(entry), time.time()))
+
+    def unresolved(self):
+        """Return (source, status, issue_id, label) for every entry recorded for review"""
+
+        return self.execute("SELECT source, status, issue_id, label FROM unresolved ORDER BY recorded")
+
+    def clear_unresolved(self):
+        self.execute("DELETE FROM unresolved")
+
+
+class Scheduler(object):
+    """queues a job for each source every interval seconds"""
+
+    def __init__(self, queue, sources, interval):
+        self.queue = queue
+        self.sources = sources
+        self.interval = interval
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        for source in self.sources:
+            last = self.queue.last_scheduled(source)
+            if last is None or now - last >= self.interval:
+                self.queue.enqueue(source, now)
+
+
+class Backpressure(object):
+    """slows uploads down while YouTrack is slow to answer
+
+    It keeps a moving average of how long writes take. While that is
+    above the target, each worker waits before its next write, longer
+    the slower YouTrack gets, up to max_delay seconds.
+    """
+
+    def __init__(self, target=1.0, max_delay=30.0, smoothing=0.2):
+        self.target = target
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+        self.latency = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latency += self.smoothing * (seconds - self.latency)
+
+    def delay(self):
+        if self.latency <= self.target:
+            return 0.0
+        return min(self.max_delay, self.latency * (self.latency / self.target - 1))
+
+    def wait(self):
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+
+class Importer(object):
+    """runs one sync job for a source, without asking any questions
+
+    Sources are "toggl" for the Toggl API, or "manictime:<path>" and
+    "toggl-csv:<path>" for exports. Issues that can't be found are
+    recorded in the queue instead of prompting for them, and so are
+    entries overlapping a work item already in YouTrack, which are left
+    alone rather than updated.
+    """
+
+    row_classes = {
+        "toggl": TogglAPIRow,
+        "toggl-csv": TogglCSVRow,
+        "manictime": ManictimeRow,
+    }
+
+    def __init__(self, connect, queue, toggl_auth=None, backpressure=None, profiler=None, tolerance=0,
+                 toggl_url=None):
+        """
+        Args:
+            connect: callable returning a new YouTrack connection and the
+            login of its user, called once per job
+            toggl_auth: tuple of the Toggl auth and workspace id
+            toggl_url: base url of Toggl, if not the real one
+        """
+
+        self.connect = connect
+        self.queue = queue
+        self.toggl_auth = toggl_auth
+        self.backpressure = backpressure or Backpressure()
+        self.profiler = profiler or Profiler()
+        self.tolerance = tolerance
+        self.toggl_url = toggl_url
+
+    def rows(self, source):
+        """Return the raw rows of the source and the Row class to read them with"""
+
+        kind, separator, path = source.partition(":")
+        if kind not in self.row_classes:
+            raise ValueError("Unknown sync source: {0}".format(source))
+        row_class = self.row_classes[kind]
+        if row_class is TogglAPIRow:
+            if not self.toggl_auth:
+                raise ValueError("No configuration set for connection to Toggl")
+            auth, workspace_id = self.toggl_auth
+            last_success = self.queue.last_success(source)
+            today = datetime.date.today()
+            since = datetime.date.fromtimestamp(last_success) if last_success else today - datetime.timedelta(days=1)
+            rows = toggl.fetch_entries(auth, workspace_id, since, today, self.profiler, self.toggl_url)
+            return rows, row_class
+        with MappedCSVReader(path, row_class.csv_columns) as reader:
+            return list(reader), row_class
+
+    def __call__(self, job):
+        """Run the job and return a dict of counts per plan status
+
+        If Toggl can't be read the job fails, so it is tried again without
+        moving on past the entries it never fetched. If the uploaded
+        entries can't be tagged, they are counted as "untagged"; they are
+        found as duplicates and tagged by the next job.
+        """
+
+        try:
+            rows, row_class = self.rows(job.source)
+        except requests.RequestException as e:
+            raise IOError("Could not fetch time entries from Toggl: {0}".format(e))
+        connection, login = self.connect()
+        plan = Planner(connection, login, self.profiler, self.tolerance).plan(rows, row_class)
+        counts = plan.counts()
+        created = []
+        tagged = []
+        for entry in plan.entries:
+            if entry['status'] == Plan.DUPLICATE:
+                # already uploaded, possibly by a job that then failed to tag it
+                tagged.extend(entry.get('source_ids', []))
+            elif entry['status'] in (Plan.UNRESOLVED, Plan.CONFLICT):
+                self.queue.record_unresolved(job.source, entry)
+            elif entry['status'] == Plan.CREATE:
+                self.backpressure.wait()
+                start = time.perf_counter()
+                try:
+                    with self.profiler.stage('save_work_item'):
+                        PlannedRow(entry, connection, login).save_work_item()
+                except YoutrackIssueNotFoundException as e:
+                    counts[Plan.CREATE] -= 1
+                    counts[Plan.UNRESOLVED] += 1
+                    self.queue.record_unresolved(job.source, dict(entry, status=Plan.UNRESOLVED))
+                else:
+                    created.extend(entry.get('source_ids', []))
+                finally:
+                    self.backpressure.record(time.perf_counter() - start)
+
+        # save_work_item also adds the ids to the set shared by every Row class, which the
+        # long running service would otherwise grow forever
+        PlannedRow.ids.difference_update(created)
+        tagged.extend(created)
+        if tagged and row_class is TogglAPIRow:
+            try:
+                toggl.tag_entries(self.toggl_auth[0], tagged, self.profiler, self.toggl_url)
+            except requests.RequestException as e:
+                counts['untagged'] = len(tagged)
+        return counts
+
+
+class SyncLock(object):
+    """lock file stopping two sync services running at once"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = None
+
+    def acquire(self):
+        """Return True if the lock was taken, False if another process holds it"""
+
+        self.fp = open(self.path, 'a')
+        try:
+            if fcntl:
+                fcntl.flock(self.fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self.fp.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as e:
+            self.fp.close()
+            self.fp = None
+            return False
+        return True
+
+    def release(self):
+        if self.fp:
+            self.fp.close()
+            self.fp = None
+
+
+class SyncService(object):
+    """runs queued jobs on a pool of workers, queueing new ones on schedule"""
+
+    def __init__(self, queue, scheduler, run_job, workers=2, poll=30, retry_delay=300, max_attempts=3,
+                 on_finish=None):
+        """
+        Args:
+            run_job: callable taking a Job and returning its result
+            on_finish: callable taking the Job and its result, or the
+            exception it raised
+        """
+
+        self.queue = queue
+        self.scheduler = scheduler
+        self.run_job = run_job
+        self.workers = workers
+        self.poll = poll
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.on_finish = on_finish or (lambda job, result: None)
+
+    def run(self, once=False):
+        """Run until interrupted, or with once, until no job is due or running"""
+
+        self.queue.recover()
+        running = dict()
+        with ThreadPoolExecutor(self.workers) as executor:
+            while True:
+                self.scheduler.tick()
+                while len(running) < self.workers:
+                    job = self.queue.claim()
+                    if job is None:
+                        break
+                    running[executor.submit(self.run_job, job)] = job
+
+                if not running:
+                    if once:
+                        return
+                    time.sleep(self.poll)
+                    continue
+
+                done, pending = wait(running, timeout=self.poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.queue.fail(job, e, self.retry_delay, self.max_attempts)
+                        self.on_finish(job, e)
+                    else:
+                        self.queue.finish(job, result)
+                        self.on_finish(job, result)
@@ -0,0 +1,103 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.aggregate import aggregate
+from youtrack_time_importer.aggregate import round_minutes
+from youtrack_time_importer.aggregate import AggregatedRow
+from youtrack_time_importer.row import ManictimeRow
+from youtrack_time_importer.row import TogglAPIRow
+
+__author__ = 'Matthew'
+
+
+def manictime_row(description, start_time, duration="0:05:40", start_date='2014-10-06'):
+    data = {
+        'Description': description,
+        'Duration': duration,
+        'Start date': start_date,
+        'Start time': start_time,
+    }
+    return ManictimeRow(data, MagicMock(), 'username')
+
+
+class TestRoundMinutes(TestCase):
+    def test_round_to_minute(self):
+        self.assertEqual(6, round_minutes(330))
+
+    def test_round_to_quarter_hour(self):
+        self.assertEqual(15, round_minutes(660, 15))
+        self.assertEqual(30, round_minutes(1400, 15))
+
+
+class TestAggregate(TestCase):
+    def setUp(self):
+        self.rows = [
+            manictime_row('BCSM-15 Support', '10:00:00'),
+            manictime_row('BCSM-16 Other', '10:10:00'),
+            manictime_row('BCSM-15 Support', '09:00:00'),
+            manictime_row('BCSM-15 Code review', '11:00:00'),
+            manictime_row('BCSM-15 Support', '09:00:00', start_date='2014-10-07'),
+            manictime_row('ignore BCSM-15', '12:00:00'),
+        ]
+
+    def test_aggregate_groups_by_issue_and_day(self):
+        rows = aggregate(self.rows, MagicMock(), 'username')
+        self.assertEqual(4, len(rows))
+        self.assertIsInstance(rows[0], AggregatedRow)
+        self.assertEqual(3, len(rows[0].rows))
+        self.assertIs(self.rows[1], rows[1])
+        self.assertIs(self.rows[4], rows[2])
+        self.assertIs(self.rows[5], rows[3])
+
+    def test_work_item(self):
+        row = aggregate(self.rows, MagicMock(), 'username')[0]
+        self.assertEqual('BCSM-15', row.issue_id)
+        self.assertEqual('17', row.work_item.duration)
+        self.assertEqual(self.rows[2].work_item.date, row.work_item.date)
+        self.assertEqual("BCSM-15 Support\nBCSM-15 Code review", row.work_item.description)
+
+    def test_start_timestamp(self):
+        row = aggregate(self.rows, MagicMock(), 'username')[0]
+        self.assertEqual(int(self.rows[2].work_item.date), row.start_timestamp())
+
+    def test_rounding(self):
+        rows = aggregate(self.rows, MagicMock(), 'username', 15)
+        self.assertEqual('15', rows[0].work_item.duration)
+        self.assertIsInstance(rows[1], AggregatedRow)
+        self.assertEqual('0', rows[1].work_item.duration)
+        self.assertIs(self.rows[5], rows[3])
+
+    def test_fingerprint_is_stable(self):
+        first = aggregate(self.rows, MagicMock(), 'username')[0]
+        second = aggregate(list(reversed(self.rows)), MagicMock(), 'username')
+        second = [row for row in second if isinstance(row, AggregatedRow)][0]
+        self.assertEqual(first.fingerprint(), second.fingerprint())
+        self.assertEqual(first.work_item.date, second.work_item.date)
+        self.assertEqual(first.work_item.duration, second.work_item.duration)
+
+    def test_save_work_item_records_toggl_ids(self):
+        data = {
+            'description': 'BCSM-15 Support',
+            'dur': 60000,
+            'start': '2014-10-06T15:05:00+01:00',
+            'tags': [],
+        }
+        rows = [TogglAPIRow(dict(data, id=1), MagicMock(), 'username'),
+                TogglAPIRow(dict(data, id=2, start='2014-10-06T16:05:00+01:00'), MagicMock(), 'username')]
+        row = aggregate(rows, MagicMock(), 'username')[0]
+        row.save_work_item()
+        self.assertIn(1, TogglAPIRow.ids)
+        self.assertIn(2, TogglAPIRow.ids)
+
+    def test_update_work_item_records_toggl_ids(self):
+        data = {
+            'description': 'BCSM-15 Support',
+            'dur': 60000,
+            'start': '2014-10-07T15:05:00+01:00',
+            'tags': [],
+        }
+        rows = [TogglAPIRow(dict(data, id=3), MagicMock(), 'username'),
+                TogglAPIRow(dict(data, id=4, start='2014-10-07T16:05:00+01:00'), MagicMock(), 'username')]
+        row = aggregate(rows, MagicMock(), 'username')[0]
+        row.update_work_item(MagicMock(url='http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1'))
+        self.assertIn(3, TogglAPIRow.ids)
+        self.assertIn(4, TogglAPIRow.ids)
@@ -0,0 +1,117 @@
+from unittest import TestCase
+from youtrack import WorkItem
+from youtrack import YouTrackException
+from youtrack_time_importer.cache import CachedConnection
+from youtrack_time_importer.cache import ENTRY_OVERHEAD
+from youtrack_time_importer.cache import ResponseCache
+from youtrack_time_importer.fake_server import FakeServer
+from youtrack_time_importer.row import fetch_work_items
+from youtrack_time_importer.row import ManictimeRow
+
+__author__ = 'Matthew'
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_bytes=3 * (ENTRY_OVERHEAD + 100))
+
+    def test_ttls(self):
+        self.assertEqual(3600, self.cache.ttl('/user/current'))
+        self.assertEqual(300, self.cache.ttl('/issue/BCSM-15/timetracking/workitem'))
+        self.assertEqual(300, self.cache.ttl('/issue/BCSM-15'))
+        self.assertEqual(60, self.cache.ttl('/issue?after=0&max=100&filter=updated'))
+        self.assertEqual(0, self.cache.ttl('/issue/BCSM-15/timetracking/workitem/abc'))
+        self.assertEqual(0, self.cache.ttl('/admin/project'))
+
+    def test_ttls_overridden(self):
+        cache = ResponseCache(ttls={'user': 0})
+        self.assertEqual(0, cache.ttl('/user/current'))
+        self.assertEqual(300, cache.ttl('/issue/BCSM-15'))
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('a', now=0))
+        self.cache.set('a', 'value', 10, 100, now=0)
+        self.assertEqual('value', self.cache.get('a', now=5))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_expired(self):
+        self.cache.set('a', 'value', 10, 100, now=0)
+        self.assertIsNone(self.cache.get('a', now=10))
+        self.assertEqual(0, len(self.cache))
+
+    def test_lru_eviction(self):
+        for key in 'abc':
+            self.cache.set(key, key, 10, 100, now=0)
+        self.cache.get('a', now=0)
+        self.cache.set('d', 'd', 10, 100, now=0)
+        self.assertIsNone(self.cache.get('b', now=0))
+        self.assertEqual('a', self.cache.get('a', now=0))
+        self.assertEqual(1, self.cache.evictions)
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+    def test_too_large_not_cached(self):
+        self.cache.set('a', 'value', 10, self.cache.max_bytes)
+        self.assertEqual(0, len(self.cache))
+
+    def test_invalidate_issue(self):
+        self.cache.set('work items 15', 1, 10, 10, 'BCSM-15')
+        self.cache.set('work items 16', 2, 10, 10, 'BCSM-16')
+        self.cache.set('search', 3, 10, 10, 'search')
+        self.cache.invalidate('/issue/BCSM-15/timetracking/workitem')
+        self.assertEqual(['work items 16'], list(self.cache.entries))
+
+    def test_invalidate_other(self):
+        self.cache.set('user', 1, 10, 10)
+        self.cache.invalidate('/admin/project')
+        self.assertEqual(0, len(self.cache))
+
+
+class TestCachedConnection(TestCase):
+    def setUp(self):
+        self.server = FakeServer().start()
+        self.server.add_issue("BCSM-15")
+        self.server.add_work_item("BCSM-15", 1000, 60, "Support")
+        self.connection = CachedConnection(self.server.url)
+        self.connection._login("matt", "secret")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_reads_cached(self):
+        requests = self.server.stats['requests']
+        self.assertEqual(1, len(fetch_work_items(self.connection, "BCSM-15")))
+        self.assertEqual(1, len(self.connection.getWorkItems("BCSM-15")))
+        self.assertEqual(requests + 1, self.server.stats['requests'])
+        self.assertEqual(1, self.connection.cache.hits)
+
+    def test_create_work_item_invalidates(self):
+        fetch_work_items(self.connection, "BCSM-15")
+        work_item = WorkItem()
+        work_item.date = "2000"
+        work_item.duration = "30"
+        work_item.description = "Bug"
+        self.connection.createWorkItem("BCSM-15", work_item)
+        self.assertEqual(2, len(fetch_work_items(self.connection, "BCSM-15")))
+
+    def test_update_work_item_invalidates(self):
+        existing = fetch_work_items(self.connection, "BCSM-15")[0]
+        row = ManictimeRow({'Description': 'BCSM-15 Support', 'Duration': '1:30:00', 'Start date': '2014-10-06',
+                            'Start time': '15:05:00'}, self.connection, 'matt')
+        self.assertIsNone(row.conflicting_work_item())
+        row.update_work_item(existing)
+        work_items = fetch_work_items(self.connection, "BCSM-15")
+        self.assertEqual([(row.work_item.date, "90")], [(item.date, item.duration) for item in work_items])
+        self.assertEqual(work_items[0].date, row.conflicting_work_item().date)
+
+    def test_current_user_not_cached(self):
+        self.connection._get('/user/current')
+        self.assertEqual('matt', self.connection.current_user().documentElement.getAttribute('login'))
+        # a saved session is reused without credentials to log in again with
+        self.connection._last_credentials = None
+        self.server.sessions.clear()
+        self.assertRaises(YouTrackException, self.connection.current_user)
+
+    def test_errors_not_cached(self):
+        for i in range(2):
+            self.assertEqual([], self.connection.getWorkItems("BCSM-404"))
+        self.assertEqual(0, len(self.connection.cache))
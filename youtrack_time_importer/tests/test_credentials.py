@@ -0,0 +1,58 @@
+from unittest import TestCase
+from unittest.mock import patch
+from youtrack_time_importer import credentials
+from youtrack_time_importer.credentials import SessionCache
+import os
+import stat
+import tempfile
+
+__author__ = 'Matthew'
+
+url = "https://youtrack.example.com/"
+
+
+class TestSessionCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sessions.json')
+        self.sessions = SessionCache(self.path, ttl=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_missing(self):
+        self.assertIsNone(self.sessions.get(url, "matt"))
+
+    def test_set_and_get(self):
+        self.sessions.set(url, "matt", "YTSESSION=abc", now=1000)
+        self.assertEqual("YTSESSION=abc", self.sessions.get(url, "matt", now=1059))
+        self.assertIsNone(self.sessions.get(url, "sam", now=1059))
+
+    def test_expired(self):
+        self.sessions.set(url, "matt", "YTSESSION=abc", now=1000)
+        self.assertIsNone(self.sessions.get(url, "matt", now=1060))
+
+    def test_delete(self):
+        self.sessions.set(url, "matt", "YTSESSION=abc")
+        self.sessions.delete(url, "matt")
+        self.assertIsNone(self.sessions.get(url, "matt"))
+
+    def test_file_private(self):
+        self.sessions.set(url, "matt", "YTSESSION=abc")
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    def test_unreadable_file(self):
+        with open(self.path, 'w') as fp:
+            fp.write("not json")
+        self.assertIsNone(self.sessions.get(url, "matt"))
+
+
+class TestPasswords(TestCase):
+    def test_without_keyring(self):
+        with patch.object(credentials, 'keyring', None):
+            self.assertFalse(credentials.set_password(url, "matt", "secret"))
+            self.assertIsNone(credentials.get_password(url, "matt"))
+            credentials.delete_password(url, "matt")
+
+    def test_credential_key(self):
+        self.assertEqual("matt@https://youtrack.example.com", credentials.credential_key(url, "matt"))
@@ -0,0 +1,119 @@
+from unittest import TestCase
+from youtrack import WorkItem
+from youtrack import YouTrackException
+from youtrack.connection import Connection
+from youtrack_time_importer.fake_server import FakeServer
+from youtrack_time_importer.fake_server import RateLimiter
+from youtrack_time_importer.row import fetch_work_items
+from youtrack_time_importer.row import ManictimeRow
+from youtrack_time_importer import toggl
+import contextlib
+import datetime
+import io
+import requests
+
+__author__ = 'Matthew'
+
+auth = ("token", "api_token")
+
+
+def work_item(date, duration, description):
+    item = WorkItem()
+    item.date = str(date)
+    item.duration = str(duration)
+    item.description = description
+    return item
+
+
+class TestFakeYouTrack(TestCase):
+    def setUp(self):
+        self.server = FakeServer(password="secret").start()
+        self.server.add_issue("BCSM-15")
+        self.server.add_work_item("BCSM-15", 1000, 60, "Support")
+        self.connection = Connection(self.server.url)
+        self.connection._login("matt", "secret")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_login_rejected(self):
+        connection = Connection(self.server.url)
+        self.assertRaises(YouTrackException, connection._login, "matt", "wrong")
+
+    def test_current_user(self):
+        user = self.connection._get('/user/current').getElementsByTagName('user')[0]
+        self.assertEqual("matt", user.attributes['login'].value)
+
+    def test_create_work_item(self):
+        self.connection.createWorkItem("BCSM-15", work_item(2000, 30, "Bug <fix> & test"))
+        work_items = fetch_work_items(self.connection, "BCSM-15")
+        self.assertEqual(2, len(work_items))
+        self.assertEqual(("2000", "30", "Bug <fix> & test", "matt"), (
+            work_items[1].date, work_items[1].duration, work_items[1].description, work_items[1].authorLogin))
+        self.assertTrue(work_items[1].url.startswith(self.server.url))
+
+    def test_update_work_item(self):
+        existing = fetch_work_items(self.connection, "BCSM-15")[0]
+        self.connection._req('PUT', existing.url, b"<workItem><date>1000</date><duration>75</duration>"
+                                                  b"<description>Support</description></workItem>")
+        work_items = fetch_work_items(self.connection, "BCSM-15")
+        self.assertEqual([("1000", "75")], [(item.date, item.duration) for item in work_items])
+
+    def test_unknown_issue(self):
+        self.assertRaises(YouTrackException, fetch_work_items, self.connection, "BCSM-404")
+
+    def test_unknown_issue_prints_nothing(self):
+        row = ManictimeRow({'Description': 'BCSM-404 Support', 'Duration': '1:00:00', 'Start date': '2014-10-06',
+                            'Start time': '15:05:00'}, self.connection, 'matt')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertFalse(row.work_item_exists())
+            self.assertIsNone(row.conflicting_work_item())
+        self.assertEqual("", stdout.getvalue())
+
+    def test_issues_paged(self):
+        for number in range(16, 20):
+            self.server.add_issue("BCSM-{0}".format(number))
+        issues = self.connection.getAllIssues("", 2, 2)
+        self.assertEqual(["BCSM-17", "BCSM-18"], [issue.id for issue in issues])
+
+    def test_errors_injected(self):
+        self.server.error_rate = 1.0
+        self.server.error_status = 404
+        self.assertRaises(YouTrackException, fetch_work_items, self.connection, "BCSM-15")
+        self.assertEqual(1, self.server.stats['errors'])
+
+
+class TestFakeToggl(TestCase):
+    def setUp(self):
+        self.server = FakeServer(page_size=3).start()
+        start = datetime.datetime(2014, 10, 6, 15, 0, tzinfo=datetime.timezone.utc)
+        for i in range(8):
+            self.server.add_entry("BCSM-{0} Support".format(i), start + datetime.timedelta(hours=i), 600)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_fetch_entries_paged(self):
+        entries = toggl.fetch_entries(auth, 1, "2014-10-06", "2014-10-06", base_url=self.server.url)
+        self.assertEqual(["BCSM-{0} Support".format(i) for i in range(8)], [e['description'] for e in entries])
+
+    def test_fetch_entries_rate_limited(self):
+        self.server.limiter = RateLimiter(2)
+        entries = toggl.fetch_entries(auth, 1, "2014-10-06", "2014-10-06", base_url=self.server.url)
+        self.assertEqual(8, len(entries))
+        self.assertLess(0, self.server.stats['rate_limited'])
+
+    def test_fetch_entries_error(self):
+        self.server.error_rate = 1.0
+        self.assertRaises(requests.HTTPError, toggl.fetch_entries, auth, 1, "2014-10-06", "2014-10-06",
+                          base_url=self.server.url)
+
+    def test_tag_entries(self):
+        toggl.tag_entries(auth, [2, 3], base_url=self.server.url)
+        self.assertEqual([[], ["youtracked"], ["youtracked"]], [e['tags'] for e in self.server.entries[:3]])
+
+    def test_endpoint(self):
+        self.assertEqual(toggl.DETAILS_URL, toggl.endpoint(toggl.DETAILS_URL))
+        self.assertEqual("http://127.0.0.1:8111/api/v8/time_entries/{0}",
+                         toggl.endpoint(toggl.TIME_ENTRIES_URL, "http://127.0.0.1:8111/"))
@@ -0,0 +1,59 @@
+from unittest import TestCase
+from youtrack_time_importer.fingerprint import fingerprint
+from youtrack_time_importer.fingerprint import work_item_fingerprint
+from youtrack_time_importer.fingerprint import work_item_key
+from youtrack_time_importer.fingerprint import FingerprintIndex
+from youtrack import WorkItem
+
+__author__ = 'Matthew'
+
+
+def work_item(author, date, duration):
+    item = WorkItem()
+    item.authorLogin = author
+    item.date = str(date)
+    item.duration = str(duration)
+    return item
+
+
+class TestFingerprint(TestCase):
+    def test_fingerprint_is_an_integer(self):
+        self.assertIsInstance(fingerprint('matt', 1412604300000, 205), int)
+
+    def test_fingerprint_ignores_string_or_integer(self):
+        self.assertEqual(fingerprint('matt', 1412604300000, 205), fingerprint('matt', '1412604300000', '205'))
+
+    def test_fingerprint_includes_source_id(self):
+        self.assertNotEqual(fingerprint('matt', 1412604300000, 205), fingerprint('matt', 1412604300000, 205, 166078570))
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(7408769842915576077, fingerprint('matt', 1412604300000, 205))
+
+    def test_work_item_fingerprint(self):
+        self.assertEqual(fingerprint('matt', 1000, 10), work_item_fingerprint(work_item('matt', 1000, 10)))
+
+
+class TestFingerprintIndex(TestCase):
+    def setUp(self):
+        self.index = FingerprintIndex([work_item('matt', 1000, 10), work_item('sam', 2000, 30)])
+
+    def test_contains(self):
+        self.assertTrue(self.index.contains('matt', 1000, 10))
+        self.assertFalse(self.index.contains('sam', 1000, 10))
+        self.assertFalse(self.index.contains('matt', 1000, 11))
+
+    def test_contains_with_tolerance(self):
+        self.assertTrue(self.index.contains('matt', 1000, 11, tolerance=1))
+        self.assertTrue(self.index.contains('matt', 1000, 9, tolerance=1))
+        self.assertFalse(self.index.contains('matt', 1000, 12, tolerance=1))
+        self.assertFalse(self.index.contains('matt', 1001, 10, tolerance=1))
+
+    def test_contains_key(self):
+        self.assertTrue(self.index.contains_key(work_item_key('matt', '1000', '10')))
+        self.assertTrue(self.index.contains_key(work_item_key('sam', 2000, 31), tolerance=1))
+        self.assertFalse(self.index.contains_key(work_item_key(None, 1000, 10)))
+
+    def test_add(self):
+        self.index.add('matt', 3000, 5)
+        self.assertTrue(self.index.contains('matt', 3000, 5))
+        self.assertEqual(3, len(self.index))
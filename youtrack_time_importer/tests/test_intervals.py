@@ -0,0 +1,61 @@
+from unittest import TestCase
+from youtrack import WorkItem
+from youtrack_time_importer.intervals import IntervalIndex
+from youtrack_time_importer.intervals import MINUTE_MS
+
+__author__ = 'Matthew'
+
+
+def work_item(start, minutes, author="matt"):
+    item = WorkItem()
+    item.date = str(start * MINUTE_MS)
+    item.duration = str(minutes)
+    item.authorLogin = author
+    return item
+
+
+class TestIntervalIndex(TestCase):
+    def setUp(self):
+        self.work_items = [work_item(60, 30), work_item(0, 120), work_item(200, 10), work_item(300, 60, "sam")]
+        self.index = IntervalIndex(self.work_items)
+
+    def test_len(self):
+        self.assertEqual(4, len(self.index))
+
+    def test_overlapping(self):
+        self.assertIs(self.work_items[2], self.index.overlapping("matt", 205 * MINUTE_MS, 30))
+
+    def test_earliest_overlapping(self):
+        self.assertIs(self.work_items[1], self.index.overlapping("matt", 70 * MINUTE_MS, 5))
+
+    def test_contained_in_long_work_item(self):
+        self.assertIs(self.work_items[1], self.index.overlapping("matt", 100 * MINUTE_MS, 5))
+
+    def test_touching_not_overlapping(self):
+        self.assertIsNone(self.index.overlapping("matt", 120 * MINUTE_MS, 80))
+        self.assertIsNone(self.index.overlapping("matt", 190 * MINUTE_MS, 10))
+
+    def test_per_author(self):
+        self.assertIsNone(self.index.overlapping("matt", 310 * MINUTE_MS, 10))
+        self.assertIs(self.work_items[3], self.index.overlapping("sam", 310 * MINUTE_MS, 10))
+        self.assertIsNone(self.index.overlapping("nobody", 0, 1000))
+
+    def test_added_after_lookup(self):
+        self.assertIsNone(self.index.overlapping("matt", 400 * MINUTE_MS, 10))
+        item = work_item(395, 10)
+        self.index.add_work_item(item)
+        self.assertIs(item, self.index.overlapping("matt", 400 * MINUTE_MS, 10))
+
+    def test_all_overlapping(self):
+        self.assertEqual([self.work_items[1], self.work_items[0]], self.index.all_overlapping("matt", 70 * MINUTE_MS, 5))
+        self.assertEqual([self.work_items[1], self.work_items[2]],
+                         self.index.all_overlapping("matt", 100 * MINUTE_MS, 105))
+        self.assertEqual([], self.index.all_overlapping("matt", 120 * MINUTE_MS, 80))
+
+    def test_all_overlapping_skips_ended(self):
+        work_items = [work_item(0, 10), work_item(5, 100), work_item(20, 5), work_item(30, 10)]
+        index = IntervalIndex(work_items)
+        self.assertEqual([work_items[1], work_items[3]], index.all_overlapping("matt", 32 * MINUTE_MS, 3))
+
+    def test_overlapping_work_item(self):
+        self.assertIs(self.work_items[1], self.index.overlapping_work_item(work_item(100, 20), "matt"))
@@ -0,0 +1,64 @@
+from unittest import TestCase
+from youtrack_time_importer.mapped_csv import MappedCSVReader
+import csv
+import os
+import tempfile
+
+__author__ = 'Matthew'
+
+test_data = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+class TestMappedCSVReader(TestCase):
+    def write(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_matches_dict_reader(self):
+        for name in ('TogglData.csv', 'ManicTimeData.old.csv'):
+            path = os.path.join(test_data, name)
+            with open(path, encoding='utf-8-sig', newline='') as fp:
+                expected = list(csv.DictReader(fp))
+            with MappedCSVReader(path) as reader:
+                self.assertEqual(expected, list(reader))
+
+    def test_only_columns_asked_for(self):
+        path = os.path.join(test_data, 'TogglData.csv')
+        with MappedCSVReader(path, ('Description', 'Duration', 'Missing')) as reader:
+            rows = list(reader)
+        self.assertEqual({'Description': 'Something', 'Duration': '02:03:00'}, rows[0])
+
+    def test_quoted_fields(self):
+        path = self.write(b'A,B,C\r\n"x, y","say ""hi""","line\nbreak"\r\nplain,,last\r\n')
+        with MappedCSVReader(path) as reader:
+            rows = list(reader)
+        self.assertEqual([
+            {'A': 'x, y', 'B': 'say "hi"', 'C': 'line\nbreak'},
+            {'A': 'plain', 'B': '', 'C': 'last'},
+        ], rows)
+
+    def test_no_trailing_newline_and_blank_lines(self):
+        path = self.write(b'A,B\n1,2\n\n3,4')
+        with MappedCSVReader(path) as reader:
+            self.assertEqual([{'A': '1', 'B': '2'}, {'A': '3', 'B': '4'}], list(reader))
+
+    def test_rows_from_offset(self):
+        path = self.write(b'A,B\n1,2\n3,4\n5,6\n')
+        with MappedCSVReader(path) as reader:
+            offsets = [offset for offset, data in reader.rows()]
+            self.assertEqual([{'A': '3', 'B': '4'}, {'A': '5', 'B': '6'}],
+                             [data for offset, data in reader.rows(offsets[1])])
+            self.assertEqual(({'A': '5', 'B': '6'}, reader.size), reader.read_row(offsets[2]))
+
+    def test_empty_file(self):
+        path = self.write(b'')
+        with MappedCSVReader(path) as reader:
+            self.assertEqual([], list(reader))
+
+    def test_unterminated_quote(self):
+        path = self.write(b'A,B\n"1,2\n')
+        with MappedCSVReader(path) as reader:
+            self.assertRaises(csv.Error, list, reader)
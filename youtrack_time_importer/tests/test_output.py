@@ -0,0 +1,77 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.output import create_reporter
+from youtrack_time_importer.output import HumanReporter
+from youtrack_time_importer.output import JsonLinesReporter
+from youtrack_time_importer.output import QuietReporter
+from youtrack import WorkItem
+import io
+import json
+
+__author__ = 'Matthew'
+
+
+class TestJsonLinesReporter(TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.reporter = JsonLinesReporter(self.stream, buffer_size=2)
+        self.row = MagicMock(issue_id='BCSM-15')
+        self.row.__str__ = MagicMock(return_value="BCSM-15 Support - 15:05 06/10/14")
+        work_item = WorkItem()
+        work_item.description = "BCSM-15 Support"
+        work_item.duration = "205"
+        work_item.date = "1412604300000"
+        self.row._work_item = work_item
+
+    def lines(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_entry_is_buffered(self):
+        self.reporter.entry("created", self.row)
+        self.assertEqual("", self.stream.getvalue())
+        self.reporter.entry("duplicate", self.row)
+        self.assertEqual(2, len(self.lines()))
+
+    def test_entry_does_not_format_row(self):
+        self.reporter.entry("created", self.row)
+        self.reporter.close()
+        self.row.__str__.assert_not_called()
+        event = self.lines()[0]
+        self.assertEqual("created", event['status'])
+        self.assertEqual("BCSM-15", event['issue_id'])
+        self.assertEqual("205", event['duration'])
+
+    def test_entry_without_work_item(self):
+        self.row._work_item = None
+        self.row.issue_id = False
+        self.reporter.entry("ignored", self.row)
+        self.reporter.close()
+        self.assertEqual({"event": "entry", "status": "ignored", "issue_id": None}, self.lines()[0])
+
+    def test_summary(self):
+        self.reporter.summary(3, {"created": 2, "ignored": 1})
+        self.reporter.close()
+        event = self.lines()[0]
+        self.assertEqual(3, event['total'])
+        self.assertEqual(2, event['created'])
+        self.assertEqual(0, event['unresolved'])
+        self.assertNotIn('cache', event)
+
+    def test_summary_with_cache(self):
+        self.reporter.summary(3, {"created": 2}, {"hits": 5, "misses": 2, "evictions": 0, "entries": 2, "bytes": 900})
+        self.reporter.close()
+        self.assertEqual(5, self.lines()[0]['cache']['hits'])
+
+    def test_fatal_flushes(self):
+        self.reporter.fatal(self.row, "Unable to connect to YouTrack")
+        self.assertEqual("Unable to connect to YouTrack", self.lines()[0]['error'])
+
+    def test_not_interactive(self):
+        self.assertFalse(self.reporter.interactive)
+
+
+class TestCreateReporter(TestCase):
+    def test_modes(self):
+        self.assertIsInstance(create_reporter("human"), HumanReporter)
+        self.assertIsInstance(create_reporter("jsonl"), JsonLinesReporter)
+        self.assertIsInstance(create_reporter("quiet"), QuietReporter)
@@ -0,0 +1,97 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.parallel import parse_file
+from youtrack_time_importer.mapped_csv import MappedCSVReader
+from youtrack_time_importer.parallel import parse_range
+from youtrack_time_importer.parallel import split_ranges
+from youtrack_time_importer.row import ManictimeRow
+from youtrack_time_importer.row import ParsedRecord
+from youtrack_time_importer.row import TogglCSVRow
+import csv
+import os
+import tempfile
+
+__author__ = 'Matthew'
+
+def first_row(path):
+    with MappedCSVReader(path) as reader:
+        return reader.start
+
+
+fieldnames = ['User', 'Email', 'Description', 'Start date', 'Start time', 'Duration', 'Tags']
+
+
+class TestParallel(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8-sig', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(fieldnames)
+            for i in range(50):
+                description = 'BCSM-{0} Support, "quoted"'.format(i) + (" ignore" if i % 10 == 0 else "")
+                writer.writerow(['Mkendon', 'mkendon@gmail.com', description,
+                                 '2014-10-06', '15:{0:02}:00'.format(i), '00:10:00', 'Test'])
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_split_ranges_cover_file(self):
+        offset = first_row(self.path)
+        ranges = split_ranges(self.path, 7, offset)
+        self.assertEqual(offset, ranges[0][0])
+        self.assertEqual(os.path.getsize(self.path), ranges[-1][1])
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+        with open(self.path, 'rb') as fp:
+            data = fp.read()
+        for start, end in ranges:
+            self.assertEqual(b"\n", data[end - 1:end])
+
+    def test_parse_range(self):
+        offset = first_row(self.path)
+        records = parse_range(self.path, offset, os.path.getsize(self.path), TogglCSVRow)
+        self.assertEqual(50, len(records))
+        self.assertIsInstance(records[1], ParsedRecord)
+        self.assertEqual('BCSM-1', records[1].issue_id)
+        self.assertEqual('10', records[1].duration)
+        self.assertTrue(records[0].ignored)
+        self.assertIsNone(records[0].date)
+
+    def test_parse_file_keeps_order(self):
+        records = parse_file(self.path, TogglCSVRow, 2)
+        self.assertEqual(['BCSM-{0}'.format(i) for i in range(50)], [record.issue_id for record in records])
+
+    def test_row_from_record(self):
+        offset = first_row(self.path)
+        record = parse_range(self.path, offset, os.path.getsize(self.path), TogglCSVRow)[1]
+        row = TogglCSVRow.create(record, MagicMock(), 'username')
+        self.assertEqual('BCSM-1', row.issue_id)
+        self.assertEqual(record.date, row.work_item.date)
+        self.assertEqual('BCSM-1 Support, "quoted"', row.work_item.description)
+
+
+class TestParallelMultilineFields(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(ManictimeRow.csv_columns)
+            for i in range(40):
+                writer.writerow(['first line\n"second", line\nthird line', 'BCSM-{0} Support'.format(i),
+                                 '0:10:00', '2014-10-06', '15:{0:02}:00'.format(i)])
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_split_ranges_at_row_breaks(self):
+        offset = first_row(self.path)
+        with MappedCSVReader(self.path) as reader:
+            row_starts = set(start for start, data in reader.rows()) | {os.path.getsize(self.path)}
+        for parts in (3, 7, 40):
+            for start, end in split_ranges(self.path, parts, offset):
+                self.assertIn(start, row_starts)
+                self.assertIn(end, row_starts)
+
+    def test_parse_file(self):
+        records = parse_file(self.path, ManictimeRow, 3)
+        self.assertEqual(['BCSM-{0}'.format(i) for i in range(40)], [record.issue_id for record in records])
@@ -0,0 +1,183 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.plan import Plan
+from youtrack_time_importer.plan import PlannedRow
+from youtrack_time_importer.plan import Planner
+from youtrack_time_importer.row import ManictimeRow
+from youtrack import YouTrackException
+import io
+
+__author__ = 'Matthew'
+
+mockResponse = MagicMock(headers=list(), content=list(), status=404, reason="Not Found")
+
+work_items_xml = (b'<workItems><workItem url="http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1">'
+                  b'<date>{date}</date><duration>205</duration><description>Support</description>'
+                  b'<author login="username"/></workItem></workItems>')
+
+short_work_item_xml = (b'<workItem url="http://youtrack/rest/issue/BCSM-17/timetracking/workitem/{id}">'
+                       b'<date>{date}</date><duration>5</duration><description>Support</description>'
+                       b'<author login="username"/></workItem>')
+
+
+def row_data(description, start_time='15:05:00'):
+    return {
+        'Description': description,
+        'Duration': "3:24:54",
+        'Start date': '2014-10-06',
+        'Start time': start_time,
+    }
+
+
+class TestPlanner(TestCase):
+    def setUp(self):
+        self.connection = MagicMock()
+        self.planner = Planner(self.connection, 'username')
+        date = ManictimeRow(row_data('BCSM-15 Support'), None, 'username').work_item.date
+        self.existing = work_items_xml.replace(b'{date}', date.encode())
+        # three 5 minute work items in a row, which one entry merged from them all overlaps
+        self.short = b'<workItems>' + b''.join(
+            short_work_item_xml.replace(b'{id}', str(i).encode()).replace(
+                b'{date}', str(int(date) + i * 5 * 60 * 1000).encode()) for i in range(3)) + b'</workItems>'
+
+    def req(self, method, url, content_type=None):
+        if 'BCSM-15' in url:
+            return MagicMock(status=200), self.existing
+        if 'BCSM-17' in url:
+            return MagicMock(status=200), self.short
+        if 'BCSM-16' in url:
+            return MagicMock(status=200), b"<workItems/>"
+        raise YouTrackException(url, mockResponse, b"")
+
+    def test_plan(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        rows = [
+            row_data('BCSM-15 Support'),
+            row_data('BCSM-15 Support', '16:05:00'),
+            row_data('BCSM-16 Support'),
+            row_data('BCSM-16 Support'),
+            row_data('ignore this'),
+            row_data('No issue'),
+            row_data('NOPE-1 Support'),
+        ]
+        plan = self.planner.plan(rows, ManictimeRow)
+        self.assertEqual(['duplicate', 'conflict', 'create', 'duplicate', 'ignored', 'unresolved', 'unresolved'],
+                         [entry['status'] for entry in plan.entries])
+        self.assertEqual('http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1',
+                         plan.entries[1]['conflict']['url'])
+        self.assertEqual(3, self.connection._req.call_count)
+        self.assertEqual('ManictimeRow', plan.source)
+
+    def test_prefetch_only_fetches_once(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        self.planner.prefetch(['BCSM-15', 'BCSM-15'])
+        self.planner.prefetch(['BCSM-15'])
+        self.assertEqual(1, self.connection._req.call_count)
+        self.assertEqual(1, len(self.planner.work_items['BCSM-15']))
+        self.assertEqual(1, len(self.planner.intervals['BCSM-15']))
+
+    def test_shared_conflict_updated_once(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        plan = self.planner.plan([row_data('BCSM-15 Support', '15:10:00'), row_data('BCSM-15 Support', '16:05:00')],
+                                 ManictimeRow)
+        self.assertEqual(['conflict', 'conflict'], [entry['status'] for entry in plan.entries])
+        self.assertEqual('http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1',
+                         plan.entries[0]['conflict']['url'])
+        self.assertNotIn('conflict', plan.entries[1])
+        self.assertEqual(['http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1'],
+                         [conflict['url'] for conflict in plan.entries[1]['conflicts']])
+
+    def test_conflict_spanning_work_items_not_updated(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        plan = self.planner.plan([row_data('BCSM-17 Support')], ManictimeRow)
+        self.assertEqual(['conflict'], [entry['status'] for entry in plan.entries])
+        self.assertNotIn('conflict', plan.entries[0])
+        self.assertEqual(3, len(plan.entries[0]['conflicts']))
+
+    def test_claims_kept_when_forgotten(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        row = ManictimeRow(row_data('BCSM-15 Support', '16:05:00'), self.connection, 'username')
+        self.planner.prefetch(['BCSM-15'])
+        conflict = self.planner.update_target(row, self.planner.conflicts(row))
+        self.assertIsNotNone(conflict)
+        self.planner.claim(row, conflict)
+        self.planner.forget('BCSM-15')
+        self.planner.prefetch(['BCSM-15'])
+        self.assertIsNone(self.planner.update_target(row, self.planner.conflicts(row)))
+
+    def test_touching_work_item_not_a_conflict(self):
+        self.connection._req = MagicMock(side_effect=self.req)
+        plan = self.planner.plan([row_data('BCSM-15 Support', '18:30:00')], ManictimeRow)
+        self.assertEqual(['create'], [entry['status'] for entry in plan.entries])
+
+
+class TestPlan(TestCase):
+    def test_save_and_load(self):
+        row = ManictimeRow(row_data('BCSM-15 Support'), None, 'username')
+        plan = Plan('ManictimeRow', 'username')
+        plan.add(Plan.CREATE, row)
+        fp = io.StringIO()
+        plan.save(fp)
+        fp.seek(0)
+        loaded = Plan.load(fp)
+        self.assertEqual(plan.entries, loaded.entries)
+        self.assertEqual({'create': 1, 'duplicate': 0, 'ignored': 0, 'unresolved': 0, 'conflict': 0},
+                         loaded.counts())
+
+    def test_load_rejects_unknown_version(self):
+        self.assertRaises(ValueError, Plan.load, io.StringIO('{"version": 99}'))
+
+
+class TestPlannedRow(TestCase):
+    def setUp(self):
+        self.entry = {
+            'status': 'create',
+            'issue_id': 'BCSM-15',
+            'label': 'BCSM-15 Support - 15:05 06/10/14',
+            'source_id': None,
+            'description': 'BCSM-15 Support',
+            'duration': '205',
+            'date': '1412604300000',
+        }
+        self.row = PlannedRow(self.entry, MagicMock(), 'username')
+
+    def test_work_item(self):
+        self.assertEqual('205', self.row.work_item.duration)
+        self.assertEqual('1412604300000', self.row.work_item.date)
+
+    def test_start_timestamp(self):
+        self.assertEqual(1412604300000, self.row.start_timestamp())
+
+    def test_issue_id(self):
+        self.assertEqual('BCSM-15', self.row.issue_id)
+
+    def test_is_ignored(self):
+        self.assertFalse(self.row.is_ignored())
+        self.entry['status'] = 'duplicate'
+        self.assertTrue(self.row.is_ignored())
+
+    def test_is_ignored_conflict(self):
+        self.entry['status'] = 'conflict'
+        self.assertFalse(self.row.is_ignored())
+
+    def test_conflicting_work_item(self):
+        self.assertIsNone(self.row.conflicting_work_item())
+        self.entry['conflict'] = {'url': 'http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1', 'id': '1',
+                                  'date': '1412604000000', 'duration': '60', 'description': 'Support'}
+        work_item = self.row.conflicting_work_item()
+        self.assertEqual(('http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1', '60'),
+                         (work_item.url, work_item.duration))
+
+    def test_conflicting_work_items(self):
+        conflict = {'url': 'http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1', 'id': '1',
+                    'date': '1412604000000', 'duration': '60', 'description': 'Support'}
+        self.assertEqual([], self.row.conflicting_work_items())
+        self.entry['conflict'] = conflict
+        self.assertEqual(['1'], [work_item.id for work_item in self.row.conflicting_work_items()])
+        del self.entry['conflict']
+        self.entry['conflicts'] = [conflict, dict(conflict, id='2')]
+        self.assertIsNone(self.row.conflicting_work_item())
+        self.assertEqual(['1', '2'], [work_item.id for work_item in self.row.conflicting_work_items()])
+
+    def test__str__(self):
+        self.assertEqual('BCSM-15 Support - 15:05 06/10/14', str(self.row))
@@ -0,0 +1,74 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.profiler import Profiler
+from youtrack_time_importer.profiler import LatencyHistogram
+import json
+
+__author__ = 'Matthew'
+
+
+class TestLatencyHistogram(TestCase):
+    def setUp(self):
+        self.histogram = LatencyHistogram()
+
+    def test_add_counts_in_bucket(self):
+        self.histogram.add(0.003)
+        self.histogram.add(0.004)
+        self.histogram.add(10)
+        self.assertEqual(3, self.histogram.count)
+        self.assertEqual(2, self.histogram.counts[LatencyHistogram.buckets.index(5)])
+        self.assertEqual(1, self.histogram.counts[-1])
+
+    def test_mean_is_zero_when_empty(self):
+        self.assertEqual(0.0, self.histogram.mean())
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.profiler = Profiler()
+
+    def test_stage_records_time(self):
+        with self.profiler.stage('parse'):
+            pass
+        with self.profiler.stage('parse'):
+            pass
+        self.assertEqual(2, self.profiler.stages['parse'].count)
+
+    def test_stage_records_time_when_exception_raised(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.stage('login'):
+                raise ValueError()
+        self.assertEqual(1, self.profiler.stages['login'].count)
+
+    def test_request_is_keyed_by_host(self):
+        with self.profiler.request('https://toggl.com/reports/api/v2/details'):
+            pass
+        self.assertIn('toggl.com', self.profiler.hosts)
+
+    def test_instrument_http(self):
+        connection = MagicMock()
+        connection.http.request = MagicMock(return_value=('response', 'content'))
+        self.profiler.instrument_http(connection)
+        result = connection.http.request('https://youtrack.example.com/rest/user/current', 'GET')
+        self.assertEqual(('response', 'content'), result)
+        self.assertEqual(1, self.profiler.hosts['youtrack.example.com'].count)
+
+    def test_instrument_http_only_wraps_once(self):
+        connection = MagicMock()
+        connection.http.request = MagicMock(return_value=('response', 'content'))
+        self.profiler.instrument_http(connection)
+        self.profiler.instrument_http(connection)
+        connection.http.request('https://youtrack.example.com/rest/user/current', 'GET')
+        self.assertEqual(1, self.profiler.hosts['youtrack.example.com'].count)
+
+    def test_to_json(self):
+        with self.profiler.stage('fetch'):
+            pass
+        data = json.loads(self.profiler.to_json())
+        self.assertEqual(1, data['stages']['fetch']['count'])
+        self.assertIn('hosts', data)
+
+    def test_report(self):
+        with self.profiler.stage('save_work_item'):
+            pass
+        self.assertIn('save_work_item', self.profiler.report())
@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.reconcile import CHANGED
+from youtrack_time_importer.reconcile import Difference
+from youtrack_time_importer.reconcile import MISSING_IN_SOURCE
+from youtrack_time_importer.reconcile import MISSING_IN_YOUTRACK
+from youtrack_time_importer.reconcile import reconcile
+from youtrack_time_importer.reconcile import source_entries
+from youtrack_time_importer.reconcile import write_differences
+import io
+
+__author__ = 'Matthew'
+
+
+def row(issue_id, date, minutes, description="Support", ignored=False):
+    return MagicMock(issue_id=issue_id, is_ignored=MagicMock(return_value=ignored),
+                     work_item=MagicMock(date=str(date), duration=str(minutes), description=description))
+
+
+class TestSourceEntries(TestCase):
+    def test_filters_range_and_ignored(self):
+        rows = [row('BCSM-1', 1000, 10), row('BCSM-2', 2000, 20, ignored=True), row(False, 3000, 30),
+                row('BCSM-4', 5000, 40)]
+        self.assertEqual([('BCSM-1', 1000, 10, 'Support'), (None, 3000, 30, 'Support')],
+                         source_entries(rows, 1000, 5000))
+
+
+class TestReconcile(TestCase):
+    def setUp(self):
+        self.work_items = [
+            ('BCSM-1', 'matt', 1000, 10, 'Support'),
+            ('BCSM-2', 'matt', 2000, 25, 'Bug'),
+            ('BCSM-3', 'matt', 4000, 15, 'Deploy'),
+            ('BCSM-9', 'sam', 3000, 30, 'Not mine'),
+        ]
+        self.entries = [
+            ('BCSM-1', 1000, 10, 'Support'),
+            ('BCSM-2', 2000, 20, 'Bug'),
+            ('BCSM-5', 3000, 30, 'New'),
+        ]
+
+    def test_differences(self):
+        self.assertEqual([
+            Difference(CHANGED, 'BCSM-2', 2000, 20, 25, 'Bug'),
+            Difference(MISSING_IN_YOUTRACK, 'BCSM-5', 3000, 30, None, 'New'),
+            Difference(MISSING_IN_SOURCE, 'BCSM-3', 4000, None, 15, 'Deploy'),
+        ], reconcile(self.entries, self.work_items, 'matt'))
+
+    def test_tolerance(self):
+        statuses = [d.status for d in reconcile(self.entries, self.work_items, 'matt', tolerance=5)]
+        self.assertEqual([MISSING_IN_YOUTRACK, MISSING_IN_SOURCE], statuses)
+
+    def test_exact_match_preferred(self):
+        work_items = [('BCSM-1', 'matt', 1000, 10, 'a'), ('BCSM-1', 'matt', 1000, 20, 'b')]
+        entries = [('BCSM-1', 1000, 15, 'a'), ('BCSM-1', 1000, 10, 'a')]
+        self.assertEqual([Difference(CHANGED, 'BCSM-1', 1000, 15, 20, 'a')], reconcile(entries, work_items, 'matt'))
+
+    def test_repeated_entries(self):
+        entries = [('BCSM-1', 1000, 10, 'Support')] * 2
+        self.assertEqual([Difference(MISSING_IN_YOUTRACK, 'BCSM-1', 1000, 10, None, 'Support')],
+                         reconcile(entries, self.work_items[:1], 'matt'))
+
+    def test_other_issue_never_matches(self):
+        self.assertEqual([
+            Difference(MISSING_IN_YOUTRACK, 'A-1', 1000, 30, None, 'x'),
+            Difference(MISSING_IN_SOURCE, 'B-9', 1000, None, 30, 'y'),
+        ], reconcile([('A-1', 1000, 30, 'x')], [('B-9', 'matt', 1000, 30, 'y')], 'matt'))
+        self.assertEqual([
+            Difference(MISSING_IN_YOUTRACK, 'A-1', 1000, 20, None, 'x'),
+            Difference(MISSING_IN_SOURCE, 'B-9', 1000, None, 30, 'y'),
+        ], reconcile([('A-1', 1000, 20, 'x')], [('B-9', 'matt', 1000, 30, 'y')], 'matt'))
+
+    def test_write_differences(self):
+        fp = io.StringIO()
+        write_differences([Difference(MISSING_IN_SOURCE, 'BCSM-3', 0, None, 15, 'Deploy')], fp)
+        lines = fp.getvalue().splitlines()
+        self.assertEqual("status,issue_id,date,source_minutes,youtrack_minutes,description", lines[0])
+        self.assertTrue(lines[1].startswith("missing_in_source,BCSM-3,19"))
+        self.assertTrue(lines[1].endswith(",,15,Deploy"))
@@ -0,0 +1,82 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.store import refresh
+from youtrack_time_importer.store import WorkItemStore
+from youtrack import WorkItem
+import datetime
+
+__author__ = 'Matthew'
+
+
+def work_item(author, date, duration, description="Support"):
+    item = WorkItem()
+    item.authorLogin = author
+    item.date = str(date)
+    item.duration = str(duration)
+    item.description = description
+    return item
+
+
+class TestWorkItemStore(TestCase):
+    def setUp(self):
+        self.store = WorkItemStore(':memory:')
+        self.store.replace_work_items('BCSM-15', [work_item('matt', 1000, 60), work_item('sam', 2000, 30)])
+        self.store.replace_work_items('BCSM-16', [work_item('matt', 3000, 15)])
+        self.store.replace_work_items('AFI-1', [work_item('matt', 9000, 45)])
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_report_by_issue(self):
+        self.assertEqual([('BCSM-15', 90, 2), ('BCSM-16', 15, 1)], self.store.report('issue', 0, 5000))
+
+    def test_report_by_project(self):
+        self.assertEqual([('BCSM', 105, 3), ('AFI', 45, 1)], self.store.report('project', 0, 10000))
+
+    def test_report_by_user(self):
+        self.assertEqual([('matt', 120, 3), ('sam', 30, 1)], self.store.report('user', 0, 10000))
+
+    def test_report_for_author(self):
+        self.assertEqual([('BCSM-15', 30, 1)], self.store.report('issue', 0, 10000, 'sam'))
+
+    def test_replace_work_items(self):
+        self.store.replace_work_items('BCSM-15', [work_item('matt', 1000, 90)])
+        self.assertEqual([('BCSM-15', 90, 1), ('BCSM-16', 15, 1)], self.store.report('issue', 0, 5000))
+
+    def test_work_items(self):
+        self.assertEqual([('BCSM-16', 'matt', 3000, 15, 'Support')], self.store.work_items(2500, 5000, 'matt'))
+
+
+class TestRefresh(TestCase):
+    def setUp(self):
+        self.store = WorkItemStore(':memory:')
+        self.connection = MagicMock()
+        self.connection.getAllIssues = MagicMock(return_value=[MagicMock(id='BCSM-15')])
+        self.connection._req = MagicMock(return_value=(
+            MagicMock(status=200),
+            b'<workItems><workItem><date>1000</date><duration>60</duration><author login="matt"/></workItem></workItems>'))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_refresh(self):
+        self.assertEqual(1, refresh(self.store, self.connection, datetime.date(2014, 10, 1)))
+        self.connection.getAllIssues.assert_called_once_with("updated: 2014-10-01 .. Today", 0, 100)
+        self.assertEqual([('BCSM-15', 60, 1)], self.store.report('issue', 0, 5000))
+        self.assertEqual(datetime.date.today(), self.store.last_refresh())
+
+    def test_refresh_is_incremental(self):
+        refresh(self.store, self.connection, datetime.date(2014, 10, 1))
+        refresh(self.store, self.connection, datetime.date(2014, 10, 5))
+        search = "updated: {0:%Y-%m-%d} .. Today".format(datetime.date.today())
+        self.assertEqual(search, self.connection.getAllIssues.call_args[0][0])
+
+    def test_refresh_goes_back_for_earlier_dates(self):
+        refresh(self.store, self.connection, datetime.date(2014, 10, 1))
+        refresh(self.store, self.connection, datetime.date(2014, 9, 1))
+        self.assertEqual("updated: 2014-09-01 .. Today", self.connection.getAllIssues.call_args[0][0])
+
+    def test_refresh_pages(self):
+        self.connection.getAllIssues = MagicMock(side_effect=[[MagicMock(id='BCSM-15')], []])
+        self.assertEqual(1, refresh(self.store, self.connection, datetime.date(2014, 10, 1), page_size=1))
+        self.assertEqual(2, self.connection.getAllIssues.call_count)
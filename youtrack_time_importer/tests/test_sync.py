@@ -0,0 +1,215 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from youtrack import YouTrackException
+from youtrack_time_importer.plan import Plan
+from youtrack_time_importer.row import TogglAPIRow
+from youtrack_time_importer.row import TogglCSVRow
+from youtrack_time_importer.sync import Backpressure
+from youtrack_time_importer.sync import Importer
+from youtrack_time_importer.sync import Job
+from youtrack_time_importer.sync import JobQueue
+from youtrack_time_importer.sync import Scheduler
+from youtrack_time_importer.sync import SyncLock
+from youtrack_time_importer.sync import SyncService
+import csv
+import os
+import requests
+import tempfile
+
+__author__ = 'Matthew'
+
+
+class TestJobQueue(TestCase):
+    def setUp(self):
+        self.queue = JobQueue(':memory:')
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_enqueue_once_per_source(self):
+        self.assertIsNotNone(self.queue.enqueue('toggl', 100))
+        self.assertIsNone(self.queue.enqueue('toggl', 200))
+        self.assertIsNotNone(self.queue.enqueue('manictime:export.csv', 200))
+
+    def test_claim_due_job(self):
+        self.queue.enqueue('toggl', 100)
+        self.assertIsNone(self.queue.claim(50))
+        job = self.queue.claim(150)
+        self.assertEqual(('toggl', 1), (job.source, job.attempts))
+        self.assertIsNone(self.queue.claim(150))
+
+    def test_finish(self):
+        self.queue.enqueue('toggl', 100)
+        job = self.queue.claim(150)
+        self.queue.finish(job, {'create': 1})
+        self.assertEqual(150, self.queue.last_success('toggl'))
+        self.assertIsNotNone(self.queue.enqueue('toggl', 200))
+
+    def test_fail_retries_then_gives_up(self):
+        self.queue.enqueue('toggl', 0)
+        job = self.queue.claim(0)
+        self.queue.fail(job, "timeout", retry_delay=0, max_attempts=2)
+        job = self.queue.claim()
+        self.assertEqual(2, job.attempts)
+        self.queue.fail(job, "timeout", retry_delay=0, max_attempts=2)
+        self.assertIsNone(self.queue.claim())
+        self.assertIsNone(self.queue.last_success('toggl'))
+
+    def test_recover_running_jobs(self):
+        self.queue.enqueue('toggl', 0)
+        self.queue.claim(0)
+        self.queue.recover()
+        self.assertEqual('toggl', self.queue.claim(0).source)
+
+    def test_unresolved_recorded_once(self):
+        entry = {'status': Plan.UNRESOLVED, 'issue_id': None, 'label': 'Support', 'source_ids': [1]}
+        self.queue.record_unresolved('toggl', entry)
+        self.queue.record_unresolved('toggl', entry)
+        self.assertEqual([('toggl', Plan.UNRESOLVED, None, 'Support')], self.queue.unresolved())
+        self.queue.clear_unresolved()
+        self.assertEqual([], self.queue.unresolved())
+
+
+class TestScheduler(TestCase):
+    def test_tick_enqueues_due_sources(self):
+        queue = JobQueue(':memory:')
+        scheduler = Scheduler(queue, ['toggl'], 60)
+        scheduler.tick(0)
+        queue.finish(queue.claim(0), {})
+        scheduler.tick(30)
+        self.assertIsNone(queue.claim(30))
+        scheduler.tick(60)
+        self.assertEqual('toggl', queue.claim(60).source)
+        queue.close()
+
+
+class TestBackpressure(TestCase):
+    def test_no_delay_under_target(self):
+        backpressure = Backpressure(target=1.0)
+        backpressure.record(0.5)
+        self.assertEqual(0.0, backpressure.delay())
+
+    def test_delay_grows_with_latency(self):
+        slow = Backpressure(target=1.0, smoothing=1.0)
+        slow.record(2.0)
+        slower = Backpressure(target=1.0, smoothing=1.0)
+        slower.record(4.0)
+        self.assertLess(0.0, slow.delay())
+        self.assertLess(slow.delay(), slower.delay())
+
+    def test_delay_capped(self):
+        backpressure = Backpressure(target=1.0, max_delay=5.0, smoothing=1.0)
+        backpressure.record(100.0)
+        self.assertEqual(5.0, backpressure.delay())
+
+
+class TestImporter(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8-sig', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['User', 'Email', 'Description', 'Start date', 'Start time', 'Duration', 'Tags'])
+            writer.writerow(['Mkendon', 'mkendon@gmail.com', 'BCSM-15 Support', '2014-10-06', '15:00:00',
+                             '00:10:00', ''])
+            writer.writerow(['Mkendon', 'mkendon@gmail.com', 'BCSM-404 Support', '2014-10-06', '16:00:00',
+                             '00:10:00', ''])
+        self.queue = JobQueue(':memory:')
+        self.connection = MagicMock()
+        self.work_items = b"<workItems/>"
+
+        def request(method, url, **kwargs):
+            if 'BCSM-404' in url:
+                raise YouTrackException(url, MagicMock(status=404), b"")
+            return MagicMock(status=200), self.work_items
+
+        self.connection._req = MagicMock(side_effect=request)
+
+    def tearDown(self):
+        self.queue.close()
+        os.remove(self.path)
+
+    def test_import_records_unresolved(self):
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue)
+        counts = importer(Job(1, 'toggl-csv:' + self.path, 1))
+        self.assertEqual(1, counts[Plan.CREATE])
+        self.assertEqual(1, counts[Plan.UNRESOLVED])
+        self.assertEqual(1, self.connection.createWorkItem.call_count)
+        self.assertEqual([('toggl-csv:' + self.path, Plan.UNRESOLVED, 'BCSM-404', 'BCSM-404 Support - 16:00 06/10/14')],
+                         self.queue.unresolved())
+
+    def test_import_records_conflicts(self):
+        date = TogglCSVRow({'Start date': '2014-10-06', 'Start time': '15:05:00', 'Duration': '00:10:00',
+                            'Description': 'BCSM-15 Support'}, None, 'matt').work_item.date
+        self.work_items = ('<workItems><workItem url="http://youtrack/rest/issue/BCSM-15/timetracking/workitem/1">'
+                           '<date>{0}</date><duration>10</duration><author login="matt"/></workItem>'
+                           '</workItems>').format(date).encode()
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue)
+        counts = importer(Job(1, 'toggl-csv:' + self.path, 1))
+        self.assertEqual(1, counts[Plan.CONFLICT])
+        self.assertEqual(0, self.connection.createWorkItem.call_count)
+        self.assertEqual([Plan.CONFLICT, Plan.UNRESOLVED], sorted(status for source, status, issue_id, label
+                                                                  in self.queue.unresolved()))
+
+    def test_toggl_ids_not_kept(self):
+        rows = [{'id': 7, 'description': 'BCSM-15 Support', 'dur': 600000, 'start': '2014-10-06T15:00:00+01:00',
+                 'tags': []}]
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue, (('token', 'api_token'), 1))
+        importer.rows = MagicMock(return_value=(rows, TogglAPIRow))
+        with patch('youtrack_time_importer.sync.toggl.tag_entries') as tag_entries:
+            importer(Job(1, 'toggl', 1))
+        self.assertEqual([7], tag_entries.call_args[0][1])
+        self.assertNotIn(7, TogglAPIRow.ids)
+
+    def test_toggl_tag_failure_counted(self):
+        rows = [{'id': 8, 'description': 'BCSM-15 Support', 'dur': 600000, 'start': '2014-10-06T15:00:00+01:00',
+                 'tags': []}]
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue, (('token', 'api_token'), 1))
+        importer.rows = MagicMock(return_value=(rows, TogglAPIRow))
+        with patch('youtrack_time_importer.sync.toggl.tag_entries', side_effect=requests.HTTPError("503")):
+            counts = importer(Job(1, 'toggl', 1))
+        self.assertEqual(1, counts['untagged'])
+
+    def test_toggl_fetch_failure_fails_job(self):
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue, (('token', 'api_token'), 1))
+        with patch('youtrack_time_importer.sync.toggl.fetch_entries', side_effect=requests.HTTPError("503")):
+            self.assertRaises(IOError, importer, Job(1, 'toggl', 1))
+
+    def test_unknown_source(self):
+        importer = Importer(lambda: (self.connection, 'matt'), self.queue)
+        self.assertRaises(ValueError, importer.rows, 'harvest')
+
+
+class TestSyncService(TestCase):
+    def test_run_once(self):
+        queue = JobQueue(':memory:')
+        results = []
+        run_job = MagicMock(side_effect=lambda job: {'create': len(job.source)})
+        service = SyncService(queue, Scheduler(queue, ['toggl', 'manictime:a.csv'], 60), run_job, workers=2,
+                              poll=0.01, on_finish=lambda job, result: results.append((job.source, result)))
+        service.run(once=True)
+        self.assertEqual(2, run_job.call_count)
+        self.assertEqual(sorted([('toggl', {'create': 5}), ('manictime:a.csv', {'create': 15})]), sorted(results))
+        queue.close()
+
+    def test_failed_job_requeued(self):
+        queue = JobQueue(':memory:')
+        run_job = MagicMock(side_effect=ValueError("Toggl is down"))
+        service = SyncService(queue, Scheduler(queue, ['toggl'], 60), run_job, poll=0.01, retry_delay=0,
+                              max_attempts=2)
+        service.run(once=True)
+        self.assertEqual(2, run_job.call_count)
+        queue.close()
+
+
+class TestSyncLock(TestCase):
+    def test_lock_held_once(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        first, second = SyncLock(path), SyncLock(path)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+        os.remove(path)
@@ -0,0 +1,44 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from youtrack_time_importer.timestamps import epoch_ms
+from youtrack_time_importer.timestamps import parse_datetime
+from youtrack_time_importer.row import TogglCSVRow
+import zoneinfo
+
+__author__ = 'Matthew'
+
+london = zoneinfo.ZoneInfo('Europe/London')
+
+
+class TestTimestamps(TestCase):
+    def test_offset_is_kept(self):
+        dt = parse_datetime('2014-10-06T15:05:00+01:00', "%Y-%m-%dT%H:%M:%S%z")
+        self.assertEqual(15, dt.hour)
+        self.assertEqual(1412604300000, epoch_ms('2014-10-06T15:05:00+01:00', "%Y-%m-%dT%H:%M:%S%z"))
+
+    def test_offset_wins_over_timezone(self):
+        self.assertEqual(1412604300000, epoch_ms('2014-10-06T14:05:00+00:00', "%Y-%m-%dT%H:%M:%S%z", london))
+
+    def test_naive_uses_timezone(self):
+        self.assertEqual(1412604300000, epoch_ms('2014-10-06 15:05:00', "%Y-%m-%d %H:%M:%S", london))
+        self.assertEqual(1418051100000, epoch_ms('2014-12-08 15:05:00', "%Y-%m-%d %H:%M:%S", london))
+
+    def test_naive_without_timezone_is_aware(self):
+        self.assertIsNotNone(parse_datetime('2014-10-06 15:05:00', "%Y-%m-%d %H:%M:%S").tzinfo)
+
+    def test_results_are_cached(self):
+        epoch_ms.cache_clear()
+        epoch_ms('2014-10-06 15:05:00', "%Y-%m-%d %H:%M:%S", london)
+        epoch_ms('2014-10-06 15:05:00', "%Y-%m-%d %H:%M:%S", london)
+        self.assertEqual(1, epoch_ms.cache_info().hits)
+
+
+class TestRowTimezone(TestCase):
+    def tearDown(self):
+        del TogglCSVRow.timezone
+
+    def test_row_uses_timezone(self):
+        TogglCSVRow.timezone = london
+        data = {'Description': 'BCSM-15', 'Duration': "3:24:54", 'Start date': '2014-10-06', 'Start time': '15:05:00'}
+        row = TogglCSVRow(data, MagicMock(), 'username')
+        self.assertEqual('1412604300000', row.work_item.date)
@@ -0,0 +1,32 @@
+import datetime
+import functools
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_datetime(string, datetime_format, timezone=None):
+    """Return a timezone aware datetime for the string given
+
+    Strings with a UTC offset keep it. Strings without one are read as
+    local time in timezone, or in the host's timezone if that is None.
+    Exports repeat the same start dates and times a lot, so results are
+    cached per distinct string.
+
+    Args:
+        string: the date and time to parse
+        datetime_format: the strptime format of the string
+        timezone: a tzinfo for strings without an offset
+    """
+
+    dt = datetime.datetime.strptime(string, datetime_format)
+    if dt.tzinfo is not None:
+        return dt
+    if timezone is not None:
+        return dt.replace(tzinfo=timezone)
+    return dt.astimezone()
+
+
+@functools.lru_cache(maxsize=65536)
+def epoch_ms(string, datetime_format, timezone=None):
+    """Return the string as a Unix timestamp in milliseconds"""
+
+    return round(parse_datetime(string, datetime_format, timezone).timestamp()*1000)
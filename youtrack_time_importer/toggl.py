@@ -0,0 +1,85 @@
+from youtrack_time_importer.profiler import Profiler
+import json
+import requests
+import time
+import urllib.parse
+
+DETAILS_URL = "https://toggl.com/reports/api/v2/details"
+TIME_ENTRIES_URL = "https://www.toggl.com/api/v8/time_entries/{0}"
+USER_AGENT = "matt@outlandish.com"
+
+
+def endpoint(url, base_url=None):
+    """Return the url on another host, eg. a local stand-in for Toggl, if base_url is given"""
+
+    if not base_url:
+        return url
+    return base_url.rstrip('/') + urllib.parse.urlsplit(url).path
+
+
+def send(method, url, profiler, retries=3, **kwargs):
+    """Send a request, waiting and trying again while Toggl answers 429 Too Many Requests
+
+    Raises:
+        requests.HTTPError if Toggl still answers with an error status
+    """
+
+    while True:
+        with profiler.request(url):
+            response = requests.request(method, url, **kwargs)
+        if response.status_code != 429 or retries <= 0:
+            response.raise_for_status()
+            return response
+        retries -= 1
+        try:
+            delay = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            delay = 1.0
+        time.sleep(delay)
+
+
+def fetch_entries(auth, workspace_id, since, until, profiler=None, base_url=None):
+    """Return the time entries of a workspace from the Toggl reports API
+
+    The report is paged, so pages are fetched until every entry counted
+    in total_count has been read.
+
+    Raises:
+        requests.RequestException if Toggl can't be reached, answers with
+        an error status or sends something that isn't JSON
+    """
+
+    profiler = profiler or Profiler()
+    url = endpoint(DETAILS_URL, base_url)
+    params = dict()
+    params['user_agent'] = USER_AGENT
+    params['workspace_id'] = workspace_id
+    params['since'] = since
+    params['until'] = until
+    entries = []
+    page = 1
+    with profiler.stage('fetch'):
+        while True:
+            params['page'] = page
+            result = send('GET', url, profiler, auth=auth, params=params).json()
+            data = result.get('data') or []
+            entries.extend(data)
+            if not data or len(entries) >= result.get('total_count', 0):
+                return entries
+            page += 1
+
+
+def tag_entries(auth, ids, profiler=None, base_url=None):
+    """Tag the Toggl time entries with the given ids as youtracked
+
+    Raises:
+        requests.RequestException if Toggl can't be reached or answers
+        with an error status
+    """
+
+    profiler = profiler or Profiler()
+    ids = [str(id) for id in ids]
+    url = endpoint(TIME_ENTRIES_URL, base_url).format(",".join(ids))
+    data = {"time_entry": {"tags": ["youtracked"], "tag_action": "add"}}
+    with profiler.stage('tag_update'):
+        send('PUT', url, profiler, auth=auth, data=json.dumps(data))